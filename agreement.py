@@ -0,0 +1,352 @@
+"""Cross-model agreement in a shared taxonomy, accumulated chunk by chunk.
+
+Every model's (segments x labels) scores are projected onto one taxonomy of
+taxonomy.py ("ekman" or "polarity") with its mapping matrix. Each projected
+row is normalised to a distribution, and its top category is that model's
+label for the segment. Rows with no mass (no NRC words, or only unmapped
+labels) have no top category and are left out of the comparisons.
+AgreementAnalysis.update() takes the next chunk of segments of a speech and
+adds to running totals, for the corpus and for that speech:
+
+    top_counts   how often each category is a model's top one
+    mass         summed distributions (the mean distribution per model)
+    confusion    (categories x categories) top-category counts per model pair,
+                 giving raw agreement and Cohen's kappa
+    divergence   summed Jensen-Shannon divergence (bits) per model pair
+    transitions  consecutive top categories within a speech, giving the
+                 switch rate and mean run length of the emotion flow
+    peaks        highest share of each category over a rolling window of
+                 `window` segments, and the segment where that window ends
+
+Every update is a handful of matrix products, bincounts and cumulative sums
+over the chunk. The memory held is a few (categories x categories) arrays
+per model pair, plus window - 1 rows of carry-over per speech and model, so
+corpora of any length stream through in fixed memory. A model whose labels
+reach fewer than two categories (sentiment in "ekman") is skipped.
+
+    analysis = AgreementAnalysis({"go_emotions": go_labels, "nrc": EMOTIONS})
+    analysis.update({"go_emotions": go_probs, "nrc": nrc_counts}, speech="milei")
+    analysis.report()
+"""
+
+import itertools
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+from scipy.special import rel_entr
+
+from taxonomy import TAXONOMIES, mapping_matrix, project
+
+# Segments per rolling window of the emotion flow
+DEFAULT_WINDOW = 10
+# Rows per update when streaming stored analyses
+DEFAULT_CHUNK_SIZE = 65536
+
+# How each model's scores combine within a category (see taxonomy.project)
+REDUCTIONS = {"go_emotions": "max", "distilroberta": "sum", "sentiment": "sum", "nrc": "sum"}
+
+
+def normalize(projected):
+    """(distributions, valid): rows scaled to sum to 1; valid is False where a row is all zero."""
+    totals = projected.sum(axis=1, keepdims=True)
+    valid = totals[:, 0] > 0
+    return np.divide(projected, totals, out=np.zeros_like(projected), where=totals > 0), valid
+
+
+def top_categories(distributions, valid):
+    """Top category per row, -1 where the row has no mass."""
+    top = distributions.argmax(axis=1)
+    top[~valid] = -1
+    return top
+
+
+def js_divergence(p, q):
+    """Row-wise Jensen-Shannon divergence in bits: 0 for identical rows, 1 for disjoint ones."""
+    m = 0.5 * (p + q)
+    return 0.5 * (rel_entr(p, m) + rel_entr(q, m)).sum(axis=-1) / np.log(2)
+
+
+def confusion(a, b, k):
+    """(k x k) counts of (a[i], b[i]) over the rows where both are >= 0."""
+    both = (a >= 0) & (b >= 0)
+    return np.bincount(a[both] * k + b[both], minlength=k * k).reshape(k, k)
+
+
+def transitions(top, k, previous=-1):
+    """(k x k) counts of consecutive top categories, skipping rows without one.
+
+    previous is the last top category before this chunk (-1 for none).
+    """
+    top = top[top >= 0]
+    if previous >= 0:
+        top = np.concatenate(([previous], top))
+    return confusion(top[:-1], top[1:], k)
+
+
+def rolling_mean(distributions, window, carry=None):
+    """(means, carry): mean distribution of every window ending in this chunk.
+
+    carry holds the last window - 1 rows of the previous chunks and is
+    returned updated, so consecutive calls see one continuous sequence.
+    """
+    rows = distributions if carry is None else np.concatenate((carry, distributions))
+    carry = rows[-(window - 1):] if window > 1 else rows[:0]
+    if len(rows) < window:
+        return np.empty((0, rows.shape[1]), dtype=np.float64), carry
+    cumulative = np.concatenate((np.zeros((1, rows.shape[1])), np.cumsum(rows, axis=0, dtype=np.float64)))
+    return (cumulative[window:] - cumulative[:-window]) / window, carry
+
+
+def kappa(matrix):
+    """Cohen's kappa of a confusion matrix, or None when it is empty."""
+    n = matrix.sum()
+    if not n:
+        return None
+    observed = np.trace(matrix) / n
+    expected = float(matrix.sum(axis=1) @ matrix.sum(axis=0)) / n**2
+    return 1.0 if expected == 1 else (observed - expected) / (1 - expected)
+
+
+@dataclass
+class _Totals:
+    k: int
+    segments: int = 0
+    top_counts: dict = field(default_factory=dict)
+    mass: dict = field(default_factory=dict)
+    scored: dict = field(default_factory=dict)
+    confusion: dict = field(default_factory=dict)
+    divergence: dict = field(default_factory=dict)
+    compared: dict = field(default_factory=dict)
+    transitions: dict = field(default_factory=dict)
+
+    def add_model(self, model, top, distributions, valid):
+        k = self.k
+        self.top_counts[model] = self.top_counts.get(model, 0) + np.bincount(top[valid], minlength=k)
+        self.mass[model] = self.mass.get(model, 0) + distributions.sum(axis=0, dtype=np.float64)
+        self.scored[model] = self.scored.get(model, 0) + int(valid.sum())
+
+    def add_pair(self, pair, matrix, divergence, compared):
+        self.confusion[pair] = self.confusion.get(pair, 0) + matrix
+        self.divergence[pair] = self.divergence.get(pair, 0.0) + divergence
+        self.compared[pair] = self.compared.get(pair, 0) + compared
+
+    def add_transitions(self, model, matrix):
+        self.transitions[model] = self.transitions.get(model, 0) + matrix
+
+    def mean_distribution(self, model):
+        scored = self.scored.get(model, 0)
+        return self.mass[model] / scored if scored else np.zeros(self.k)
+
+    def pair_report(self, pair):
+        matrix = self.confusion.get(pair, np.zeros((self.k, self.k), dtype=np.int64))
+        compared = self.compared.get(pair, 0)
+        agreement = np.trace(matrix) / matrix.sum() if matrix.sum() else None
+        value = kappa(matrix)
+        return {
+            "compared": compared,
+            "agreement": None if agreement is None else round(float(agreement), 4),
+            "kappa": None if value is None else round(float(value), 4),
+            "divergence": round(self.divergence.get(pair, 0.0) / compared, 4) if compared else None,
+        }
+
+    def flow_report(self, model):
+        matrix = self.transitions.get(model)
+        steps = int(matrix.sum()) if matrix is not None else 0
+        switches = steps - int(np.trace(matrix)) if steps else 0
+        return {
+            "switch_rate": round(switches / steps, 4) if steps else None,
+            "mean_run_length": round((steps + 1) / (switches + 1), 2) if steps else None,
+        }
+
+
+@dataclass
+class _Flow:
+    """Streaming state of one model's emotion flow in one speech."""
+
+    carry: np.ndarray = None
+    previous: int = -1
+    position: int = 0
+    peak: np.ndarray = None
+    peak_end: np.ndarray = None
+
+
+class AgreementAnalysis:
+    """Streaming agreement between models in one taxonomy."""
+
+    def __init__(self, labels, taxonomy="ekman", window=DEFAULT_WINDOW, reductions=None):
+        if taxonomy not in TAXONOMIES:
+            raise ValueError(f"Unknown taxonomy: {taxonomy!r}")
+        if window < 1:
+            raise ValueError(f"window must be >= 1, got {window}")
+        self.taxonomy = taxonomy
+        self.categories = TAXONOMIES[taxonomy]
+        self.window = window
+        self.labels = {model: list(names) for model, names in labels.items()}
+        self.reductions = {**REDUCTIONS, **(reductions or {})}
+        reach = {model: int(mapping_matrix(names, self.categories).any(axis=0).sum()) for model, names in self.labels.items()}
+        self.models = [model for model in self.labels if reach[model] >= 2]
+        self.skipped_models = [model for model in self.labels if reach[model] < 2]
+        self.pairs = list(itertools.combinations(self.models, 2))
+        self.corpus = _Totals(len(self.categories))
+        self.speeches = {}
+        self._flows = {}
+
+    def project(self, model, scores):
+        """(distributions, valid, top) of a model's scores in this taxonomy."""
+        projected = project(scores, self.labels[model], self.reductions.get(model, "sum"), self.categories)
+        distributions, valid = normalize(projected)
+        return distributions, valid, top_categories(distributions, valid)
+
+    def update(self, scores, speech="corpus"):
+        """Add the next segments of speech; scores is {model: (segments x labels) array}.
+
+        Every model must score the same segments, in the same order.
+        """
+        lengths = {len(scores[model]) for model in self.models}
+        if len(lengths) > 1:
+            raise ValueError(f"models scored different numbers of segments: {sorted(lengths)}")
+        if not lengths or not lengths.pop():
+            return
+        k = len(self.categories)
+        totals = (self.corpus, self.speeches.setdefault(speech, _Totals(k)))
+        projected = {model: self.project(model, scores[model]) for model in self.models}
+        for t in totals:
+            t.segments += len(projected[self.models[0]][0])
+
+        for model, (distributions, valid, top) in projected.items():
+            flow = self._flows.setdefault((speech, model), _Flow())
+            steps = transitions(top, k, flow.previous)
+            if valid.any():
+                flow.previous = int(top[valid][-1])
+            self._update_peaks(flow, distributions)
+            for t in totals:
+                t.add_model(model, top, distributions, valid)
+                t.add_transitions(model, steps)
+
+        for a, b in self.pairs:
+            dist_a, valid_a, top_a = projected[a]
+            dist_b, valid_b, top_b = projected[b]
+            both = valid_a & valid_b
+            matrix = confusion(top_a, top_b, k)
+            divergence = float(js_divergence(dist_a[both], dist_b[both]).sum())
+            for t in totals:
+                t.add_pair((a, b), matrix, divergence, int(both.sum()))
+
+    def _update_peaks(self, flow, distributions):
+        means, flow.carry = rolling_mean(distributions, self.window, flow.carry)
+        start = flow.position + len(distributions) - len(means)
+        flow.position += len(distributions)
+        if not len(means):
+            return
+        best = means.argmax(axis=0)
+        values = means[best, np.arange(means.shape[1])]
+        if flow.peak is None:
+            flow.peak, flow.peak_end = values, start + best
+            return
+        better = values > flow.peak
+        flow.peak = np.where(better, values, flow.peak)
+        flow.peak_end = np.where(better, start + best, flow.peak_end)
+
+    def confusion_matrix(self, a, b, speech=None):
+        """(categories x categories) counts, rows a's top category and columns b's."""
+        totals = self.corpus if speech is None else self.speeches[speech]
+        k = len(self.categories)
+        if (a, b) in totals.confusion:
+            return totals.confusion[(a, b)]
+        if (b, a) in totals.confusion:
+            return totals.confusion[(b, a)].T
+        return np.zeros((k, k), dtype=np.int64)
+
+    def _distributions(self, totals):
+        return {
+            model: dict(zip(self.categories, np.round(totals.mean_distribution(model), 4).tolist()))
+            for model in self.models
+        }
+
+    def report(self):
+        corpus = self.corpus
+        speeches = {}
+        for speech, totals in self.speeches.items():
+            peaks = {}
+            for model in self.models:
+                flow = self._flows.get((speech, model))
+                if flow is None or flow.peak is None:
+                    continue
+                peaks[model] = {
+                    category: {"share": round(float(share), 4), "window_end": int(end)}
+                    for category, share, end in zip(self.categories, flow.peak, flow.peak_end)
+                }
+            speeches[speech] = {
+                "segments": totals.segments,
+                "distribution": self._distributions(totals),
+                "pairs": {f"{a} vs {b}": totals.pair_report((a, b)) for a, b in self.pairs},
+                # How far the speech's mean distribution is from the corpus mean
+                "divergence_from_corpus": {
+                    model: round(float(js_divergence(totals.mean_distribution(model), corpus.mean_distribution(model))), 4)
+                    for model in self.models
+                    if totals.scored.get(model)
+                },
+                "flow": {model: totals.flow_report(model) for model in self.models},
+                "peak_windows": peaks,
+            }
+        return {
+            "taxonomy": self.taxonomy,
+            "categories": list(self.categories),
+            "models": self.models,
+            "skipped_models": self.skipped_models,
+            "window": self.window,
+            "segments": corpus.segments,
+            "distribution": self._distributions(corpus),
+            "top_counts": {
+                model: dict(zip(self.categories, corpus.top_counts[model].tolist()))
+                for model in self.models
+                if model in corpus.top_counts
+            },
+            "pairs": {
+                f"{a} vs {b}": {**corpus.pair_report((a, b)), "confusion": self.confusion_matrix(a, b).tolist()}
+                for a, b in self.pairs
+            },
+            "flow": {model: corpus.flow_report(model) for model in self.models},
+            "speeches": speeches,
+        }
+
+
+def analyze_state_dir(
+    state_dir,
+    taxonomies=("ekman", "polarity"),
+    window=DEFAULT_WINDOW,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """{taxonomy: report} over every speech stored by incremental.reanalyze.
+
+    The models and labels of the first stored speech are the ones compared.
+    A speech stored with a different model set or different labels is left
+    out and listed under "skipped_speeches" in every report, with the reason.
+    """
+    from incremental import SpeechAnalysis
+
+    analyses = {}
+    labels = None
+    skipped = {}
+    for name in sorted(os.listdir(state_dir)):
+        # Leftovers of an interrupted SpeechAnalysis.save end in .tmp.npz
+        if not name.endswith(".npz") or name.endswith(".tmp.npz"):
+            continue
+        stored = SpeechAnalysis.load(os.path.join(state_dir, name))
+        speech = name[: -len(".npz")]
+        if labels is None:
+            labels = stored.labels
+            analyses = {taxonomy: AgreementAnalysis(labels, taxonomy, window) for taxonomy in taxonomies}
+        elif stored.labels != labels:
+            if set(stored.labels) != set(labels):
+                skipped[speech] = f"models {sorted(stored.labels)} differ from {sorted(labels)}"
+            else:
+                changed = sorted(key for key in labels if stored.labels[key] != labels[key])
+                skipped[speech] = f"labels of {changed} differ"
+            continue
+        for start in range(0, len(stored), chunk_size):
+            chunk = {key: scores[start:start + chunk_size] for key, scores in stored.scores.items()}
+            for analysis in analyses.values():
+                analysis.update(chunk, speech)
+    return {taxonomy: dict(analysis.report(), skipped_speeches=skipped) for taxonomy, analysis in analyses.items()}
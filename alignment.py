@@ -0,0 +1,189 @@
+"""Time-aligned index from transcript segments to sample ranges of a recording.
+
+A SegmentIndex keeps, for every segment ID, the half-open sample range
+[start, end) in the recording as parallel int64 arrays sorted by start
+sample, plus the permutation that sorts them by segment ID. Both lookups are
+binary searches:
+
+    index.range(segment_id)      -> (start_sample, end_sample)
+    index.at(seconds)            -> IDs of segments covering that moment
+    index.overlapping(t0, t1)    -> IDs of segments overlapping [t0, t1)
+
+index.audio(segment_id) is a slice of the read-only np.memmap of the WAV
+data, so no samples are read until something looks at them, and
+index.prosody(segment_ids) runs audio_features on those slices only. The
+index is saved as a single .npz next to the recording.
+
+Alignments usually come from subtitle or ASR output; read_subtitles parses
+SRT and WebVTT cues into (start, end, text) tuples.
+"""
+
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from audio_features import open_wav, prosody_from_samples
+
+_TIMESTAMP = r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})"
+_CUE_TIMES = re.compile(rf"{_TIMESTAMP}\s*-->\s*{_TIMESTAMP}")
+
+
+def _seconds(hours, minutes, seconds, millis):
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+
+def read_subtitles(path):
+    """[(start_seconds, end_seconds, text)] for every cue of an SRT or WebVTT file."""
+    cues = []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        blocks = re.split(r"\n\s*\n", f.read().replace("\r\n", "\n"))
+    for block in blocks:
+        lines = block.strip().split("\n")
+        for i, line in enumerate(lines):
+            match = _CUE_TIMES.search(line)
+            if match:
+                groups = match.groups()
+                text = " ".join(part.strip() for part in lines[i + 1:] if part.strip())
+                cues.append((_seconds(*groups[:4]), _seconds(*groups[4:]), text))
+                break
+    return cues
+
+
+@dataclass
+class SegmentIndex:
+    segment_ids: np.ndarray
+    start_samples: np.ndarray
+    end_samples: np.ndarray
+    sample_rate: int
+    audio_path: str = None
+    _audio: object = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self.segment_ids = np.asarray(self.segment_ids, dtype=np.int64)
+        self.start_samples = np.asarray(self.start_samples, dtype=np.int64)
+        self.end_samples = np.asarray(self.end_samples, dtype=np.int64)
+        if not len(self.segment_ids) == len(self.start_samples) == len(self.end_samples):
+            raise ValueError("segment_ids, start_samples and end_samples must have the same length")
+        if np.any(self.end_samples < self.start_samples):
+            raise ValueError("Every segment must end at or after its start")
+        order = np.argsort(self.start_samples, kind="stable")
+        self.segment_ids = self.segment_ids[order]
+        self.start_samples = self.start_samples[order]
+        self.end_samples = self.end_samples[order]
+        self._by_id = np.argsort(self.segment_ids, kind="stable")
+        sorted_ids = self.segment_ids[self._by_id]
+        if len(sorted_ids) > 1 and np.any(sorted_ids[1:] == sorted_ids[:-1]):
+            raise ValueError("Segment IDs must be unique")
+        self._sorted_ids = sorted_ids
+        # Running maximum of end samples: monotone, so overlap queries can binary search it
+        self._max_end = np.maximum.accumulate(self.end_samples) if len(self) else self.end_samples
+
+    @classmethod
+    def from_times(cls, segment_ids, starts, ends, sample_rate, audio_path=None):
+        """Build from segment start and end times in seconds."""
+        starts = np.rint(np.asarray(starts, dtype=np.float64) * sample_rate)
+        ends = np.rint(np.asarray(ends, dtype=np.float64) * sample_rate)
+        return cls(segment_ids, starts, ends, sample_rate, audio_path)
+
+    @classmethod
+    def from_subtitles(cls, subtitle_path, audio_path, segment_ids=None):
+        """Index the cues of an SRT/VTT file against a WAV; IDs default to cue order."""
+        cues = read_subtitles(subtitle_path)
+        info, _ = open_wav(audio_path)
+        segment_ids = np.arange(len(cues)) if segment_ids is None else segment_ids
+        starts = [start for start, _, _ in cues]
+        ends = [end for _, end, _ in cues]
+        return cls.from_times(segment_ids, starts, ends, info.sample_rate, audio_path)
+
+    def __len__(self):
+        return len(self.segment_ids)
+
+    def __contains__(self, segment_id):
+        position = np.searchsorted(self._sorted_ids, segment_id)
+        return bool(position < len(self) and self._sorted_ids[position] == segment_id)
+
+    def _row(self, segment_id):
+        position = np.searchsorted(self._sorted_ids, segment_id)
+        if position >= len(self) or self._sorted_ids[position] != segment_id:
+            raise KeyError(segment_id)
+        return self._by_id[position]
+
+    def range(self, segment_id):
+        """(start_sample, end_sample) of a segment."""
+        row = self._row(segment_id)
+        return int(self.start_samples[row]), int(self.end_samples[row])
+
+    def times(self, segment_ids=None):
+        """(starts, ends) in seconds for segment_ids (default: all, in time order)."""
+        if segment_ids is None:
+            rows = np.arange(len(self))
+        else:
+            rows = np.array([self._row(segment_id) for segment_id in segment_ids], dtype=np.int64)
+        return self.start_samples[rows] / self.sample_rate, self.end_samples[rows] / self.sample_rate
+
+    def overlapping(self, start_seconds, end_seconds):
+        """IDs of segments overlapping [start_seconds, end_seconds), in time order."""
+        start = int(round(start_seconds * self.sample_rate))
+        end = int(round(end_seconds * self.sample_rate))
+        # Rows before first all end at or before start; rows from last on start at or after end
+        first = np.searchsorted(self._max_end, start, side="right")
+        last = np.searchsorted(self.start_samples, end, side="left")
+        rows = np.arange(first, max(first, last))
+        return self.segment_ids[rows[self.end_samples[rows] > start]]
+
+    def at(self, seconds):
+        """IDs of segments that cover the moment at seconds."""
+        sample = int(round(seconds * self.sample_rate))
+        return self.overlapping(seconds, (sample + 1) / self.sample_rate)
+
+    @property
+    def samples(self):
+        """Read-only memmap of the recording, opened on first use."""
+        if self._audio is None:
+            if self.audio_path is None:
+                raise ValueError("This index has no audio_path")
+            info, samples = open_wav(self.audio_path)
+            if info.sample_rate != self.sample_rate:
+                raise ValueError(f"{self.audio_path} is {info.sample_rate} Hz, the index is {self.sample_rate} Hz")
+            self._audio = samples
+        return self._audio
+
+    def audio(self, segment_id):
+        """(samples x channels) memmap view of one segment's audio; nothing is copied."""
+        start, end = self.range(segment_id)
+        return self.samples[start:end]
+
+    def prosody(self, segment_ids, **options):
+        """{segment_id: prosody summary} computed from each segment's audio only.
+
+        Every summary has a "frames" count. A segment shorter than one analysis
+        frame, such as a zero-length subtitle cue, is skipped: frames is 0 and
+        its features are NaN.
+        """
+        summaries = {}
+        for segment_id in segment_ids:
+            frames = prosody_from_samples(self.audio(segment_id), self.sample_rate, **options)
+            summaries[segment_id] = {"frames": len(frames), **frames.summary()}
+        return summaries
+
+    def save(self, path):
+        np.savez(
+            path,
+            segment_ids=self.segment_ids,
+            start_samples=self.start_samples,
+            end_samples=self.end_samples,
+            sample_rate=np.int64(self.sample_rate),
+            audio_path=np.str_(self.audio_path or ""),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["segment_ids"],
+                data["start_samples"],
+                data["end_samples"],
+                int(data["sample_rate"]),
+                str(data["audio_path"]) or None,
+            )
@@ -0,0 +1,288 @@
+"""Prosodic features from memory-mapped speech recordings.
+
+The speech side of the text vs. speech comparison. A WAV file is never
+decoded into RAM in one go: its sample data is opened as a read-only
+np.memmap and read in blocks of frames. Each block becomes a strided
+(frames x frame_length) view with sliding_window_view, so per-frame energy
+and autocorrelation pitch are computed for the whole block at once, with no
+Python loop over frames. Only the small per-frame feature arrays (about 10 KB
+per minute of audio) are kept, and from them:
+
+    energy      RMS level of each frame in dB
+    pitch       autocorrelation F0 of voiced frames, NaN elsewhere
+    pauses      runs of frames well below the recording's speech level
+    rate        energy peaks in voiced speech (syllable nuclei) per second
+
+ProsodyFrames.aggregate reduces the frame features over transcript segments
+given as (start, end) times in seconds, using cumulative sums. extract_many
+spreads files across processes.
+"""
+
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FRAME_MS = 40
+HOP_MS = 10
+MIN_PITCH_HZ = 75
+MAX_PITCH_HZ = 400
+# Normalised autocorrelation peak above which a frame counts as voiced
+VOICING_THRESHOLD = 0.45
+# Frames this far below the loud (90th percentile) level are silence
+SILENCE_DROP_DB = 30
+MIN_PAUSE_MS = 200
+# Frames per block read from the memory map
+BLOCK_FRAMES = 2048
+
+_PCM_DTYPES = {(1, 8): "u1", (1, 16): "<i2", (1, 32): "<i4", (3, 32): "<f4", (3, 64): "<f8"}
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass
+class WavInfo:
+    path: str
+    sample_rate: int
+    channels: int
+    dtype: str
+    data_offset: int
+    num_samples: int
+
+    @property
+    def duration(self):
+        return self.num_samples / self.sample_rate
+
+
+def read_wav_info(path):
+    """Parse the RIFF header: format, channels and where the sample data starts."""
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                body = f.read(size + (size & 1))
+                audio_format, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+                if audio_format == _WAVE_FORMAT_EXTENSIBLE:
+                    audio_format = struct.unpack("<H", body[24:26])[0]
+                fmt = (audio_format, channels, sample_rate, block_align, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path}: data chunk before fmt chunk")
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+    audio_format, channels, sample_rate, block_align, bits = fmt
+    dtype = _PCM_DTYPES.get((audio_format, bits))
+    if dtype is None:
+        raise ValueError(f"{path}: unsupported WAV encoding (format {audio_format}, {bits} bits)")
+    # Streamed WAVs may leave the data size unset, so trust the file size
+    available = os.path.getsize(path) - data_offset
+    data_size = size if 0 < size <= available else available
+    return WavInfo(str(path), sample_rate, channels, dtype, data_offset, data_size // block_align)
+
+
+def open_wav(path):
+    """(WavInfo, read-only (samples x channels) memmap of the raw sample data)."""
+    info = read_wav_info(path)
+    samples = np.memmap(
+        path, dtype=info.dtype, mode="r", offset=info.data_offset, shape=(info.num_samples, info.channels)
+    )
+    return info, samples
+
+
+def to_float_mono(block):
+    """Copy of a (samples x channels) block as float32 mono in [-1, 1]."""
+    if block.dtype == np.uint8:
+        audio = (block.astype(np.float32) - 128.0) / 128.0
+    elif np.issubdtype(block.dtype, np.integer):
+        audio = block.astype(np.float32) / float(-np.iinfo(block.dtype).min)
+    else:
+        audio = block.astype(np.float32)
+    return audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+
+
+def frame_features(frames, sample_rate, min_pitch=MIN_PITCH_HZ, max_pitch=MAX_PITCH_HZ):
+    """Energy (dB), pitch candidate (Hz) and voicing strength for a (frames x n) view."""
+    frame_length = frames.shape[1]
+    energy_db = 10.0 * np.log10(np.mean(np.square(frames, dtype=np.float32), axis=1) + 1e-10)
+
+    centred = (frames - frames.mean(axis=1, keepdims=True)) * np.hanning(frame_length).astype(np.float32)
+    spectrum = np.fft.rfft(centred, n=2 * frame_length, axis=1)
+    autocorr = np.fft.irfft(np.abs(spectrum) ** 2, axis=1)[:, :frame_length]
+    autocorr /= np.maximum(autocorr[:, :1], 1e-10)
+
+    low = max(int(sample_rate / max_pitch), 1)
+    high = min(int(sample_rate / min_pitch), frame_length - 2)
+    lags = np.argmax(autocorr[:, low:high], axis=1) + low
+    rows = np.arange(len(frames))
+    strength = autocorr[rows, lags]
+    # Parabolic interpolation around the peak for sub-sample lag accuracy
+    left, right = autocorr[rows, lags - 1], autocorr[rows, lags + 1]
+    denominator = left - 2 * strength + right
+    # Divide only where the peak is curved; silent frames have a flat autocorrelation
+    offset = np.divide(0.5 * (left - right), denominator, out=np.zeros_like(denominator), where=np.abs(denominator) > 1e-10)
+    pitch = sample_rate / (lags + np.clip(offset, -0.5, 0.5))
+    return energy_db.astype(np.float32), pitch.astype(np.float32), strength.astype(np.float32)
+
+
+def _runs(mask):
+    """(starts, lengths) of runs of True in a boolean array."""
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[::2], edges[1::2] - edges[::2]
+
+
+@dataclass
+class ProsodyFrames:
+    sample_rate: int
+    frame_length: int
+    hop: int
+    energy_db: np.ndarray
+    pitch_hz: np.ndarray
+    voiced: np.ndarray
+    silent: np.ndarray
+    pause_start: np.ndarray
+    nucleus: np.ndarray
+
+    def __len__(self):
+        return len(self.energy_db)
+
+    @property
+    def frame_seconds(self):
+        return self.hop / self.sample_rate
+
+    def frame_times(self):
+        """Centre time in seconds of every frame."""
+        return (np.arange(len(self)) * self.hop + self.frame_length / 2) / self.sample_rate
+
+    def aggregate(self, starts, ends):
+        """Per-segment prosody for segments spanning [starts[i], ends[i]) seconds."""
+        times = self.frame_times()
+        first = np.searchsorted(times, np.asarray(starts, dtype=np.float64))
+        last = np.searchsorted(times, np.asarray(ends, dtype=np.float64))
+
+        def segment_sum(values):
+            totals = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+            return totals[last] - totals[first]
+
+        frames = (last - first).astype(np.float64)
+        pitch = np.where(self.voiced, self.pitch_hz, 0.0)
+        voiced = segment_sum(self.voiced)
+        pitch_mean = segment_sum(pitch) / np.maximum(voiced, 1)
+        pitch_var = segment_sum(pitch ** 2) / np.maximum(voiced, 1) - pitch_mean ** 2
+        speaking_seconds = (frames - segment_sum(self.silent)) * self.frame_seconds
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "duration_s": frames * self.frame_seconds,
+                "energy_db_mean": segment_sum(self.energy_db) / frames,
+                "pitch_hz_mean": np.where(voiced > 0, pitch_mean, np.nan),
+                "pitch_hz_std": np.where(voiced > 1, np.sqrt(np.maximum(pitch_var, 0.0)), np.nan),
+                "voiced_ratio": voiced / frames,
+                "pause_ratio": segment_sum(self.silent) / frames,
+                "pause_count": segment_sum(self.pause_start).astype(np.int64),
+                "speaking_rate": np.where(speaking_seconds > 0, segment_sum(self.nucleus) / speaking_seconds, np.nan),
+            }
+
+    def summary(self):
+        """The aggregate over the whole recording, as plain floats."""
+        whole = self.aggregate([0.0], [len(self) * self.frame_seconds + 1.0])
+        return {name: float(values[0]) for name, values in whole.items()}
+
+
+def extract_prosody(path, **options):
+    """Frame-level prosody for one WAV file, reading it block by block."""
+    info, samples = open_wav(path)
+    return prosody_from_samples(samples, info.sample_rate, **options)
+
+
+def prosody_from_samples(
+    samples,
+    sample_rate,
+    frame_ms=FRAME_MS,
+    hop_ms=HOP_MS,
+    block_frames=BLOCK_FRAMES,
+    voicing_threshold=VOICING_THRESHOLD,
+    silence_drop_db=SILENCE_DROP_DB,
+    min_pause_ms=MIN_PAUSE_MS,
+):
+    """Frame-level prosody for (samples x channels) audio, e.g. a memmap or a slice of one.
+
+    The silence level is relative to the loudest frames of samples, so for a
+    single segment pauses are judged against that segment alone.
+    """
+    frame_length = int(sample_rate * frame_ms / 1000)
+    hop = int(sample_rate * hop_ms / 1000)
+    num_frames = 1 + (len(samples) - frame_length) // hop if len(samples) >= frame_length else 0
+    if num_frames == 0:
+        # Shorter than one frame: no frames, and every aggregate is NaN (counts 0)
+        empty = np.zeros(0, dtype=bool)
+        return ProsodyFrames(
+            sample_rate=sample_rate,
+            frame_length=frame_length,
+            hop=hop,
+            energy_db=np.zeros(0, dtype=np.float32),
+            pitch_hz=np.zeros(0, dtype=np.float32),
+            voiced=empty,
+            silent=empty,
+            pause_start=empty,
+            nucleus=empty,
+        )
+
+    energy_db = np.empty(num_frames, dtype=np.float32)
+    pitch = np.empty(num_frames, dtype=np.float32)
+    strength = np.empty(num_frames, dtype=np.float32)
+    for first in range(0, num_frames, block_frames):
+        last = min(first + block_frames, num_frames)
+        audio = to_float_mono(samples[first * hop:(last - 1) * hop + frame_length])
+        frames = sliding_window_view(audio, frame_length)[::hop]
+        energy_db[first:last], pitch[first:last], strength[first:last] = frame_features(frames, sample_rate)
+
+    loud = np.percentile(energy_db, 90)
+    silent = energy_db < loud - silence_drop_db
+    voiced = (strength > voicing_threshold) & ~silent
+
+    pause_start = np.zeros(num_frames, dtype=bool)
+    starts, lengths = _runs(silent)
+    pause_start[starts[lengths * hop_ms >= min_pause_ms]] = True
+
+    # Syllable nuclei: local energy maxima in voiced speech, after light smoothing
+    # The centred slice of the full convolution; mode="same" is misaligned below 5 frames
+    smooth = np.convolve(energy_db, np.ones(5, dtype=np.float32) / 5)[2:2 + num_frames]
+    nucleus = np.zeros(num_frames, dtype=bool)
+    if num_frames > 2:
+        peaks = (smooth[1:-1] > smooth[:-2]) & (smooth[1:-1] >= smooth[2:])
+        nucleus[1:-1] = peaks & voiced[1:-1]
+
+    return ProsodyFrames(
+        sample_rate=sample_rate,
+        frame_length=frame_length,
+        hop=hop,
+        energy_db=energy_db,
+        pitch_hz=np.where(voiced, pitch, np.nan).astype(np.float32),
+        voiced=voiced,
+        silent=silent,
+        pause_start=pause_start,
+        nucleus=nucleus,
+    )
+
+
+def extract_many(paths, workers=None, **options):
+    """extract_prosody for many files on a process pool: {path: ProsodyFrames}."""
+    paths = [str(path) for path in paths]
+    workers = workers or min(os.cpu_count() or 1, len(paths)) or 1
+    if workers == 1:
+        return {path: extract_prosody(path, **options) for path in paths}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {path: pool.submit(extract_prosody, path, **options) for path in paths}
+        return {path: future.result() for path, future in futures.items()}
@@ -0,0 +1,174 @@
+"""CPU inference backends for the transformer classifiers.
+
+    "eager"  fp32 PyTorch, the reference
+    "int8"   torch dynamic quantisation of every nn.Linear to int8
+    "onnx"   the model exported once to ONNX and run with ONNX Runtime
+
+Every backend returns an object that predict_probs can call exactly like the
+original model: it takes tokenizer output and returns something with a
+.logits tensor. parity_report checks how far int8 and ONNX move the label
+probabilities and top emotions away from fp32 on a set of segments.
+"""
+
+import os
+import re
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+BACKENDS = ("eager", "int8", "onnx")
+
+# Where exported ONNX graphs are kept between runs
+DEFAULT_ONNX_DIR = "onnx_models"
+
+
+def quantize_int8(model):
+    """Dynamically quantised copy of model: int8 weights for every Linear layer."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def onnx_path(model_name, revision=None, onnx_dir=DEFAULT_ONNX_DIR):
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "--", f"{model_name}@{revision or 'main'}")
+    return os.path.join(onnx_dir, f"{safe_name}.onnx")
+
+
+def export_onnx(model, tokenizer, path):
+    """Export model to path with dynamic batch and sequence axes.
+
+    The graph is written to a temporary file next to path and renamed into
+    place, so an interrupted export never leaves a truncated graph at path and
+    processes exporting at the same time each read a complete one.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # One temporary file per process: corpus_runner workers may export at once
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    sample = tokenizer(["An example segment.", "Another one"], return_tensors="pt", padding=True)
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    try:
+        with torch.inference_mode():
+            torch.onnx.export(
+                model,
+                (dict(sample),),
+                tmp_path,
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+                dynamo=False,
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class OnnxClassifier:
+    """ONNX Runtime session with the call signature of a transformers classifier."""
+
+    def __init__(self, path, config, threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as exc:
+            raise ImportError("backend='onnx' needs the onnxruntime package") from exc
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.config = config
+        self.path = path
+
+    def __call__(self, **inputs):
+        feed = {name: inputs[name].numpy() for name in self.input_names}
+        (logits,) = self.session.run(["logits"], feed)
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def eval(self):
+        return self
+
+    def requires_grad_(self, requires_grad=True):
+        return self
+
+    @property
+    def nbytes(self):
+        return os.path.getsize(self.path)
+
+
+def prepare(model, tokenizer, model_name, revision=None, backend="eager", onnx_dir=DEFAULT_ONNX_DIR):
+    """Turn a loaded fp32 eval-mode model into the requested backend."""
+    if backend == "eager":
+        return model
+    if backend == "int8":
+        return quantize_int8(model)
+    if backend == "onnx":
+        path = onnx_path(model_name, revision, onnx_dir)
+        if not os.path.exists(path):
+            export_onnx(model, tokenizer, path)
+        return OnnxClassifier(path, model.config)
+    raise ValueError(f"Unknown backend: {backend!r}; expected one of {BACKENDS}")
+
+
+def _tensor_bytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(item) for item in value)
+    return 0
+
+
+def model_nbytes(model):
+    """Weight memory of a model from any backend (quantised weights count as int8)."""
+    if isinstance(model, OnnxClassifier):
+        return model.nbytes
+    return sum(_tensor_bytes(value) for value in model.state_dict().values())
+
+
+def parity_report(key, texts, backends=("int8", "onnx"), batch_size=None, revision=None, **options):
+    """Compare int8/ONNX against eager fp32 for one of MODEL_SPECS on texts.
+
+    Reports latency, weight memory, probability differences, top-label agreement
+    and the total variation distance between the top-label distributions.
+    """
+    from inference import DEFAULT_BATCH_SIZE, MODEL_SPECS, predict_probs
+    from model_registry import registry
+
+    spec = MODEL_SPECS[key]
+    texts = list(texts)
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+
+    def run(backend):
+        entry = registry.get(spec["model_name"], revision, backend=backend)
+        start = time.perf_counter()
+        probs = predict_probs(entry.model, entry.tokenizer, texts, spec["activation"], batch_size, **options)
+        return entry, probs, time.perf_counter() - start
+
+    reference, reference_probs, reference_seconds = run("eager")
+    num_labels = reference_probs.shape[1]
+    reference_top = reference_probs.argmax(axis=1)
+    reference_dist = np.bincount(reference_top, minlength=num_labels) / max(len(texts), 1)
+
+    report = {
+        "model": spec["model_name"],
+        "segments": len(texts),
+        "eager": {"seconds": round(reference_seconds, 3), "weight_mb": round(reference.param_bytes / 2**20, 1)},
+    }
+    for backend in backends:
+        entry, probs, seconds = run(backend)
+        diff = np.abs(probs - reference_probs)
+        top = probs.argmax(axis=1)
+        dist = np.bincount(top, minlength=num_labels) / max(len(texts), 1)
+        report[backend] = {
+            "seconds": round(seconds, 3),
+            "speedup": round(reference_seconds / seconds, 2) if seconds else None,
+            "weight_mb": round(entry.param_bytes / 2**20, 1),
+            "max_abs_prob_diff": float(diff.max()) if len(texts) else 0.0,
+            "mean_abs_prob_diff": float(diff.mean()) if len(texts) else 0.0,
+            "top_label_agreement": float((top == reference_top).mean()) if len(texts) else 1.0,
+            "top_label_distribution_tvd": float(0.5 * np.abs(dist - reference_dist).sum()),
+        }
+    return report
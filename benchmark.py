@@ -0,0 +1,452 @@
+"""Throughput and latency benchmarks for the classifiers and the NRC lexicon.
+
+Every selected model is run over every corpus:
+
+    speeches    the bundled transcripts (cascade.DEFAULT_SPEECHES); missing
+                files are listed under "skipped" rather than failing the run
+    synthetic   generated corpora of N segments of about W words each,
+                given as NxW (--synthetic 1000x20 --synthetic 200x150)
+
+Each model runs in its own freshly spawned process. Its load time is
+therefore a cold load, and the process's peak RSS is the peak memory of that
+model alone. Each corpus is scored in batches of batch_size segments, after
+one warm-up batch, for `repeats` passes. The results are:
+
+    segments_per_sec, tokens_per_sec   best pass
+    batch_latency_ms                   p50/p95/p99 over every batch of every pass
+    load_seconds, peak_rss_mb          per model process
+
+The token count is what the model saw: transformer tokens from the
+"forward" stage, or matched lexicon words for NRC.
+
+Nothing is downloaded. --weights cached reads the real checkpoints from the
+local Hugging Face cache. --weights tiny and --weights base build randomly
+initialised RoBERTa classifiers with the right label counts into
+--model-dir and reuse them on later runs. "base" has the real architectures
+(12 layers for go_emotions and sentiment, 6 for DistilRoBERTa, hidden size
+768, 50265-token embedding). Its speed and memory therefore match the
+published checkpoints. Its byte-level BPE tokenizer is trained on the
+synthetic vocabulary, so token counts per segment differ from the real one.
+"tiny" is for checking the harness in seconds.
+
+    python benchmark.py --weights base --synthetic 1000x20 -o bench.json
+    python benchmark.py --weights base --synthetic 1000x20 --baseline bench.json
+
+With --baseline, rows are matched on (model, corpus). A metric that got worse
+by more than --tolerance is reported as a regression, and
+--fail-on-regression turns that into exit status 1.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cascade import DEFAULT_SPEECHES
+from inference import DEFAULT_BATCH_SIZE, MODEL_SPECS
+
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_MODEL_DIR = "benchmark_models"
+MODELS = tuple(MODEL_SPECS) + ("nrc",)
+WEIGHTS = ("cached", "tiny", "base")
+
+# A metric is a regression when it is this much worse than the baseline
+DEFAULT_TOLERANCE = 0.10
+HIGHER_IS_BETTER = ("segments_per_sec", "tokens_per_sec")
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "load_seconds", "peak_rss_mb")
+
+# Political-speech vocabulary with a share of NRC emotion words, so the
+# lexicon path does real work on synthetic text
+SYNTHETIC_WORDS = (
+    "the of and to in a that is for we our this will be are with on as it not have all by "
+    "from at they their people government state nation world country women children families "
+    "economy market capital tax growth progress development energy climate renewable solar "
+    "efficiency target emissions finance health emergency outbreak vaccine disease hospital "
+    "freedom liberty justice peace security war crisis poverty hunger hope fear anger joy trust "
+    "love hate threat victory failure disaster celebrate suffer protect destroy grateful proud "
+    "terrible wonderful violent safe danger promise betrayal courage shame thank you very much"
+).split()
+
+# Label sets of the published checkpoints, in their config order
+RANDOM_MODEL_LABELS = {
+    "go_emotions": [
+        "admiration", "amusement", "anger", "annoyance", "approval", "caring", "confusion",
+        "curiosity", "desire", "disappointment", "disapproval", "disgust", "embarrassment",
+        "excitement", "fear", "gratitude", "grief", "joy", "love", "nervousness", "optimism",
+        "pride", "realization", "relief", "remorse", "sadness", "surprise", "neutral",
+    ],
+    "distilroberta": ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"],
+    "sentiment": ["LABEL_0", "LABEL_1", "LABEL_2"],
+}
+
+# RoBERTa shapes per weight size; "layers" is per model key
+RANDOM_MODEL_SIZES = {
+    "tiny": {
+        "hidden_size": 64, "num_attention_heads": 2, "intermediate_size": 128, "vocab_size": None,
+        "layers": {"go_emotions": 2, "distilroberta": 1, "sentiment": 2},
+    },
+    "base": {
+        "hidden_size": 768, "num_attention_heads": 12, "intermediate_size": 3072, "vocab_size": 50265,
+        "layers": {"go_emotions": 12, "distilroberta": 6, "sentiment": 12},
+    },
+}
+RANDOM_TOKENIZER_VOCAB = 2000
+
+
+def synthetic_corpus(num_segments, words_per_segment, seed=0):
+    """num_segments sentences of 0.5x to 1.5x words_per_segment words."""
+    rng = np.random.default_rng(seed)
+    low = max(words_per_segment // 2, 1)
+    lengths = rng.integers(low, low + words_per_segment + 1, size=num_segments)
+    words = np.array(SYNTHETIC_WORDS)
+    return [" ".join(words[rng.integers(0, len(words), size=n)]).capitalize() + "." for n in lengths]
+
+
+def parse_synthetic(spec):
+    """"1000x20" -> (1000, 20)."""
+    try:
+        segments, words = (int(part) for part in spec.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected SEGMENTSxWORDS, got {spec!r}") from None
+    if segments < 1 or words < 1:
+        raise argparse.ArgumentTypeError(f"segments and words must be >= 1, got {spec!r}")
+    return segments, words
+
+
+def corpus_specs(speeches=DEFAULT_SPEECHES, synthetic=(), mode="line", seed=0):
+    """(specs, skipped): corpus descriptions for the worker processes and missing speeches."""
+    specs, skipped = [], []
+    for path in speeches:
+        if os.path.exists(path):
+            name = os.path.splitext(os.path.basename(path))[0]
+            specs.append({"name": name, "path": os.path.abspath(path), "mode": mode})
+        else:
+            skipped.append(path)
+    for segments, words in synthetic:
+        specs.append({"name": f"synthetic_{segments}x{words}", "segments": segments, "words": words, "seed": seed})
+    return specs, skipped
+
+
+def load_corpus(spec):
+    if "path" in spec:
+        from streaming import iter_segments
+
+        return list(iter_segments(spec["path"], spec["mode"]))
+    return synthetic_corpus(spec["segments"], spec["words"], spec["seed"])
+
+
+def build_random_models(size="tiny", model_dir=DEFAULT_MODEL_DIR, seed=0):
+    """{key: checkpoint directory} of randomly initialised classifiers, built once per size."""
+    shape = RANDOM_MODEL_SIZES[size]
+    base_dir = os.path.join(model_dir, size)
+    paths = {key: os.path.join(base_dir, key) for key in RANDOM_MODEL_LABELS}
+    if all(os.path.exists(os.path.join(path, "config.json")) for path in paths.values()):
+        return paths
+
+    import torch
+    from tokenizers import ByteLevelBPETokenizer
+    from tokenizers.processors import RobertaProcessing
+    from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaForSequenceClassification
+
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(
+        synthetic_corpus(5000, 40, seed),
+        vocab_size=RANDOM_TOKENIZER_VOCAB,
+        special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"],
+    )
+    # Wrap as <s> ... </s> like the RoBERTa tokenizers of the real checkpoints
+    bpe.post_processor = RobertaProcessing(("</s>", bpe.token_to_id("</s>")), ("<s>", bpe.token_to_id("<s>")))
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=bpe,
+        bos_token="<s>",
+        eos_token="</s>",
+        unk_token="<unk>",
+        pad_token="<pad>",
+        mask_token="<mask>",
+        model_max_length=512,
+    )
+    torch.manual_seed(seed)
+    for key, labels in RANDOM_MODEL_LABELS.items():
+        config = RobertaConfig(
+            vocab_size=shape["vocab_size"] or len(tokenizer),
+            hidden_size=shape["hidden_size"],
+            num_hidden_layers=shape["layers"][key],
+            num_attention_heads=shape["num_attention_heads"],
+            intermediate_size=shape["intermediate_size"],
+            max_position_embeddings=514,
+            type_vocab_size=1,
+            pad_token_id=tokenizer.pad_token_id,
+            bos_token_id=tokenizer.bos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            num_labels=len(labels),
+            id2label=dict(enumerate(labels)),
+            label2id={label: i for i, label in enumerate(labels)},
+        )
+        RobertaForSequenceClassification(config).save_pretrained(paths[key])
+        tokenizer.save_pretrained(paths[key])
+    return paths
+
+
+def _latency(seconds):
+    ms = 1000 * np.asarray(seconds)
+    if not len(ms):
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def _time_batches(score, texts, batch_size, repeats):
+    """(best pass seconds, every batch's seconds)."""
+    from inference import iter_batches
+
+    best, batch_seconds = float("inf"), []
+    for _ in range(repeats):
+        pass_start = time.perf_counter()
+        for _, batch in iter_batches(texts, batch_size):
+            start = time.perf_counter()
+            score(batch)
+            batch_seconds.append(time.perf_counter() - start)
+        best = min(best, time.perf_counter() - pass_start)
+    return best, batch_seconds
+
+
+def _bench_model(key, model_name, corpora, batch_size, repeats, threads, options):
+    """Benchmark one model over every corpus; runs in its own process."""
+    from profiling import peak_rss_bytes, stage_timer
+
+    if threads and key != "nrc":
+        import torch
+
+        torch.set_num_threads(threads)
+    if key == "nrc":
+        from nrc_lexicon import get_lexicon
+
+        start = time.perf_counter()
+        lexicon = get_lexicon()
+        load_seconds = time.perf_counter() - start
+        score = lexicon.raw_scores
+        token_stage = "nrc_score"
+    else:
+        from inference import predict_probs
+        from model_registry import registry
+
+        entry = registry.get(model_name, backend=options.get("backend", "eager"))
+        load_seconds = entry.load_seconds
+        model_options = {name: value for name, value in options.items() if name != "backend"}
+        activation = MODEL_SPECS[key]["activation"]
+
+        def score(texts):
+            return predict_probs(entry.model, entry.tokenizer, texts, activation, batch_size, **model_options)
+
+        token_stage = "forward"
+
+    rows = []
+    for spec in corpora:
+        texts = load_corpus(spec)
+        if not texts:
+            continue
+        score(texts[:batch_size])  # warm-up, not timed
+        stage_timer.reset()
+        best, batch_seconds = _time_batches(score, texts, batch_size, repeats)
+        stats = stage_timer.stages.get(token_stage)
+        tokens = stats.tokens // repeats if stats else 0
+        rows.append({
+            "model": key,
+            "corpus": spec["name"],
+            "segments": len(texts),
+            "tokens": tokens,
+            "segments_per_sec": round(len(texts) / best, 2),
+            "tokens_per_sec": round(tokens / best, 1),
+            "batches": len(batch_seconds),
+            **_latency(batch_seconds),
+        })
+    peak_mb = round(peak_rss_bytes() / 2**20, 1)
+    for row in rows:
+        row["load_seconds"] = round(load_seconds, 3)
+        row["peak_rss_mb"] = peak_mb
+    return rows
+
+
+def run_benchmarks(
+    corpora,
+    models=MODELS,
+    weights="cached",
+    model_dir=DEFAULT_MODEL_DIR,
+    batch_size=DEFAULT_BATCH_SIZE,
+    repeats=3,
+    threads=None,
+    isolate=True,
+    **options,
+):
+    """Result rows for every (model, corpus) pair.
+
+    With isolate=False everything runs in this process; load times are then
+    warm after the first load and peak_rss_mb is cumulative.
+    """
+    if repeats < 1:
+        raise ValueError(f"repeats must be >= 1, got {repeats}")
+    if weights not in WEIGHTS:
+        raise ValueError(f"Unknown weights: {weights!r}")
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    transformers = [key for key in models if key != "nrc"]
+    if weights == "cached" or not transformers:
+        names = {key: MODEL_SPECS[key]["model_name"] for key in transformers}
+    else:
+        names = build_random_models(weights, model_dir)
+    names["nrc"] = None
+
+    rows = []
+    for key in models:
+        args = (key, names[key], corpora, batch_size, repeats, threads, options)
+        if not isolate:
+            rows.extend(_bench_model(*args))
+            continue
+        # A fresh process per model: cold load and a peak RSS of its own
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            rows.extend(pool.submit(_bench_model, *args).result())
+    return rows
+
+
+def environment(models, weights, batch_size, repeats, threads, options):
+    """Run settings and library versions; torch is only imported when a transformer model ran."""
+    result = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "weights": weights,
+        "batch_size": batch_size,
+        "repeats": repeats,
+        "options": options,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+    if any(key != "nrc" for key in models):
+        import torch
+        import transformers
+
+        result["torch"] = torch.__version__
+        result["transformers"] = transformers.__version__
+        result["torch_threads"] = threads or torch.get_num_threads()
+    return result
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Relative change of every metric against a baseline results dict.
+
+    A change is the ratio new/old - 1, signed so that a positive number is
+    always an improvement; a regression is a change below -tolerance.
+    """
+    old_rows = {(row["model"], row["corpus"]): row for row in baseline["results"]}
+    changes = []
+    for row in results["results"]:
+        old = old_rows.get((row["model"], row["corpus"]))
+        if old is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if not old.get(metric) or metric not in row:
+                continue
+            ratio = row[metric] / old[metric]
+            change = ratio - 1 if metric in HIGHER_IS_BETTER else 1 - ratio
+            changes.append({
+                "model": row["model"],
+                "corpus": row["corpus"],
+                "metric": metric,
+                "baseline": old[metric],
+                "value": row[metric],
+                "change": round(change, 3),
+                "regression": change < -tolerance,
+            })
+    mismatched = [
+        name for name in ("weights", "batch_size", "machine", "cpu_count", "torch_threads")
+        if baseline.get("environment", {}).get(name) != results["environment"].get(name)
+    ]
+    return {"tolerance": tolerance, "environment_differs": mismatched, "changes": changes}
+
+
+def format_table(rows):
+    columns = ("model", "corpus", "segments", "segments_per_sec", "tokens_per_sec",
+               "p50_ms", "p95_ms", "p99_ms", "load_seconds", "peak_rss_mb")
+    cells = [columns] + [tuple(str(row[column]) for column in columns) for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)) for line in cells)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Throughput and latency benchmarks.")
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS))
+    parser.add_argument("--weights", choices=WEIGHTS, default="cached",
+                        help="cached checkpoints, or randomly initialised tiny/base-size models")
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR, help="where random models are built")
+    parser.add_argument("--speeches", nargs="*", default=list(DEFAULT_SPEECHES), help="transcripts to benchmark")
+    parser.add_argument("--synthetic", type=parse_synthetic, action="append", default=[], metavar="NxW",
+                        help="synthetic corpus of N segments of about W words (repeatable)")
+    parser.add_argument("--mode", choices=("line", "paragraph"), default="line", help="segmentation of the speeches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--token-budget", type=int, default=None)
+    parser.add_argument("--backend", choices=("eager", "int8", "onnx"), default="eager")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--in-process", action="store_true", help="do not spawn a process per model")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", metavar="PATH", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    options = {"backend": args.backend}
+    if args.token_budget is not None:
+        options["token_budget"] = args.token_budget
+    corpora, skipped = corpus_specs(args.speeches, args.synthetic, args.mode, args.seed)
+    if not corpora:
+        parser.error("no corpora: none of the speeches exist and no --synthetic corpus was given")
+    rows = run_benchmarks(
+        corpora,
+        args.models,
+        args.weights,
+        args.model_dir,
+        args.batch_size,
+        args.repeats,
+        args.threads,
+        isolate=not args.in_process,
+        **options,
+    )
+    results = {
+        "environment": environment(args.models, args.weights, args.batch_size, args.repeats, args.threads, options),
+        "skipped": skipped,
+        "results": rows,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["comparison"] = compare(results, json.load(f), args.tolerance)
+        regressions = [change for change in results["comparison"]["changes"] if change["regression"]]
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(format_table(rows))
+    for path in skipped:
+        print(f"skipped missing speech {path}", file=sys.stderr)
+    if args.baseline:
+        comparison = results["comparison"]
+        if comparison["environment_differs"]:
+            print(f"baseline environment differs in: {', '.join(comparison['environment_differs'])}", file=sys.stderr)
+        for change in regressions:
+            print(
+                f"REGRESSION {change['model']}/{change['corpus']} {change['metric']}: "
+                f"{change['baseline']} -> {change['value']} ({change['change']:+.1%})",
+                file=sys.stderr,
+            )
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Confidence cascade: run roberta-base go_emotions only where it is needed.
+
+Every segment first goes through the two cheap stages: the NRC lexicon and
+the j-hartmann DistilRoBERTa model. A segment is escalated to the SamLowe
+go_emotions model only when
+
+    uncertain   DistilRoBERTa's top two probabilities are within margin, or
+    disagree    the lexicon finds at least nrc_min_words emotion words, has a
+                single top Ekman emotion, and it differs from DistilRoBERTa's.
+
+The other segments keep DistilRoBERTa's label. Labels are compared in the
+Ekman space of taxonomy.py. cascade_report runs the cascade and the full
+go_emotions pass on the same speeches. It reports the fraction escalated,
+the wall-clock saving and how often the cascade's label matches the full
+run's.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from inference import DEFAULT_BATCH_SIZE, MODEL_SPECS
+from taxonomy import EKMAN, project
+
+# Escalate when DistilRoBERTa's top-1 minus top-2 probability is below this
+DEFAULT_MARGIN = 0.25
+# Lexicon matches needed before a lexicon/model disagreement counts
+DEFAULT_NRC_MIN_WORDS = 2
+
+DEFAULT_SPEECHES = ("milei_speech.txt", "von_der_leyen_cop28.txt", "tedros_speech.txt")
+
+
+@dataclass
+class CascadeResult:
+    labels: list
+    escalated: np.ndarray
+    uncertain: np.ndarray
+    disagree: np.ndarray
+    seconds: dict = field(default_factory=dict)
+
+    @property
+    def escalated_fraction(self):
+        return float(self.escalated.mean()) if len(self.escalated) else 0.0
+
+
+def _scorer(key, batch_size, backend="eager", **options):
+    from inference import predict_probs
+    from model_registry import load_model
+    from streaming import model_labels
+
+    spec = MODEL_SPECS[key]
+    tokenizer, model = load_model(spec["model_name"], backend=backend)
+    labels = model_labels(model, spec)
+
+    def score(texts):
+        return predict_probs(model, tokenizer, texts, spec["activation"], batch_size, **options)
+
+    return labels, score
+
+
+def escalation_masks(distil_ekman, nrc_ekman, margin=DEFAULT_MARGIN, nrc_min_words=DEFAULT_NRC_MIN_WORDS):
+    """(uncertain, disagree) boolean masks from Ekman-projected cheap-stage scores."""
+    top_two = np.sort(distil_ekman, axis=1)[:, -2:]
+    uncertain = top_two[:, 1] - top_two[:, 0] < margin
+
+    best = nrc_ekman.max(axis=1, keepdims=True)
+    single_top = (nrc_ekman == best).sum(axis=1) == 1
+    confident = single_top & (best[:, 0] >= nrc_min_words)
+    disagree = confident & (nrc_ekman.argmax(axis=1) != distil_ekman.argmax(axis=1))
+    return uncertain, disagree
+
+
+def run_cascade(
+    texts,
+    margin=DEFAULT_MARGIN,
+    nrc_min_words=DEFAULT_NRC_MIN_WORDS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    **options,
+):
+    """Ekman label per segment from the cheapest stage that is confident about it."""
+    from nrc_lexicon import EMOTIONS, get_lexicon
+
+    texts = list(texts)
+    distil_labels, distil_score = _scorer("distilroberta", batch_size, **options)
+    go_labels, go_score = _scorer("go_emotions", batch_size, **options)
+    seconds = {}
+
+    start = time.perf_counter()
+    nrc_ekman = project(get_lexicon().raw_scores(texts), EMOTIONS)
+    seconds["nrc"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    distil_ekman = project(distil_score(texts), distil_labels)
+    seconds["distilroberta"] = time.perf_counter() - start
+
+    uncertain, disagree = escalation_masks(distil_ekman, nrc_ekman, margin, nrc_min_words)
+    escalated = uncertain | disagree
+    top = distil_ekman.argmax(axis=1)
+
+    start = time.perf_counter()
+    rows = np.flatnonzero(escalated)
+    if len(rows):
+        go_probs = go_score([texts[i] for i in rows])
+        top[rows] = project(go_probs, go_labels, reduction="max").argmax(axis=1)
+    seconds["go_emotions"] = time.perf_counter() - start
+
+    return CascadeResult([EKMAN[i] for i in top], escalated, uncertain, disagree, seconds)
+
+
+def cascade_report(
+    speeches=DEFAULT_SPEECHES,
+    mode="line",
+    margin=DEFAULT_MARGIN,
+    nrc_min_words=DEFAULT_NRC_MIN_WORDS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    **options,
+):
+    """Cascade against the full go_emotions pass for each transcript in speeches."""
+    from streaming import iter_segments
+
+    go_labels, go_score = _scorer("go_emotions", batch_size, **options)
+    report = {}
+    for path in speeches:
+        texts = list(iter_segments(path, mode))
+        result = run_cascade(texts, margin, nrc_min_words, batch_size, **options)
+
+        start = time.perf_counter()
+        full_top = project(go_score(texts), go_labels, reduction="max").argmax(axis=1)
+        full_go_seconds = time.perf_counter() - start
+
+        cheap_seconds = result.seconds["nrc"] + result.seconds["distilroberta"]
+        cascade_seconds = cheap_seconds + result.seconds["go_emotions"]
+        full_seconds = cheap_seconds + full_go_seconds
+        agree = np.array([EKMAN[i] for i in full_top]) == np.array(result.labels)
+        kept = ~result.escalated
+        report[path] = {
+            "segments": len(texts),
+            "escalated_fraction": round(result.escalated_fraction, 3),
+            "uncertain_fraction": round(float(result.uncertain.mean()), 3) if len(texts) else 0.0,
+            "disagree_fraction": round(float(result.disagree.mean()), 3) if len(texts) else 0.0,
+            "cascade_seconds": round(cascade_seconds, 3),
+            "full_seconds": round(full_seconds, 3),
+            "time_saved": round(1 - cascade_seconds / full_seconds, 3) if full_seconds else 0.0,
+            "agreement_with_full": round(float(agree.mean()), 3) if len(texts) else 1.0,
+            "agreement_not_escalated": round(float(agree[kept].mean()), 3) if kept.any() else None,
+        }
+    return report
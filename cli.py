@@ -0,0 +1,279 @@
+"""Command-line entry point for scoring transcripts.
+
+    python cli.py score milei_speech.txt tedros_speech.txt --models nrc sentiment -o scores/
+    python cli.py corpus transcripts/ scores/ --workers 4
+    python cli.py reanalyze milei_speech.txt --state-dir analysis_state
+    python cli.py cascade milei_speech.txt --margin 0.25
+    python cli.py dedup milei_speech.txt tedros_speech.txt --time-model distilroberta
+    python cli.py agreement --state-dir analysis_state --taxonomy ekman polarity
+    python cli.py serve --models distilroberta --port 8000
+    python cli.py bench --weights base --synthetic 1000x20
+
+Only argparse and the standard library load at startup. A subcommand loads the
+modules it needs when it runs, and the transformer models only when one of
+them is selected: `score --models nrc` never imports torch or transformers.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# The keys of inference.MODEL_SPECS, spelled out so that --help imports nothing
+TRANSFORMER_MODELS = ("go_emotions", "distilroberta", "sentiment")
+MODELS = TRANSFORMER_MODELS + ("nrc",)
+
+
+def _add_model_options(parser):
+    parser.add_argument("--mode", choices=("line", "paragraph"), default="line", help="segmentation mode")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--token-budget", type=int, default=None, help="padded tokens per batch (default 1024)")
+    parser.add_argument("--backend", choices=("eager", "int8", "onnx"), default="eager")
+    parser.add_argument("--long-segments", choices=("truncate", "window"), default="truncate")
+    parser.add_argument("--dedup", choices=("exact", "near"), default=None, help="score repeated segments once")
+    parser.add_argument("--near-threshold", type=float, default=None, help="MinHash similarity for --dedup near (default 0.8)")
+
+
+def _add_scoring_options(parser):
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS))
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="segments held in memory at once")
+    parser.add_argument("--cache", metavar="PATH", help="SQLite prediction cache to read and update")
+    _add_model_options(parser)
+
+
+def _model_options(args):
+    options = {"backend": args.backend, "long_segments": args.long_segments}
+    if args.token_budget is not None:
+        options["token_budget"] = args.token_budget
+    if args.dedup is not None:
+        options["dedup"] = args.dedup
+        if args.near_threshold is not None:
+            options["near_threshold"] = args.near_threshold
+    return options
+
+
+def _transformer_options(args):
+    """Options for the transformer scorers; a lexicon-only run passes none."""
+    return _model_options(args) if set(args.models) & set(TRANSFORMER_MODELS) else {}
+
+
+def cmd_score(args):
+    from streaming import run_streaming
+
+    cache = None
+    if args.cache:
+        from prediction_cache import PredictionCache
+
+        cache = PredictionCache(args.cache)
+    os.makedirs(args.output_dir, exist_ok=True)
+    report = {}
+    for transcript in args.transcripts:
+        name = os.path.splitext(os.path.basename(transcript))[0]
+        output_path = os.path.join(args.output_dir, f"{name}.{args.format}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        start = time.perf_counter()
+        count = run_streaming(
+            transcript,
+            output_path,
+            mode=args.mode,
+            models=args.models,
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
+            cache=cache,
+            **_transformer_options(args),
+        )
+        seconds = time.perf_counter() - start
+        report[name] = {"output": output_path, "segments": count, "seconds": round(seconds, 3)}
+    if cache is not None:
+        report["cache"] = cache.stats()
+        cache.close()
+    if "shared_inference" in sys.modules:
+        report["tokenization"] = sys.modules["shared_inference"].tokenization_stats.report()
+    if args.dedup is not None:
+        from dedup import dedup_stats
+
+        report["dedup"] = dedup_stats.report()
+    return report
+
+
+def cmd_corpus(args):
+    from corpus_runner import run_corpus
+
+    return run_corpus(
+        args.source,
+        args.output_dir,
+        models=args.models,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        mode=args.mode,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        output_format=args.format,
+        cache_path=args.cache,
+        **_transformer_options(args),
+    )
+
+
+def cmd_reanalyze(args):
+    from incremental import reanalyze
+
+    reports = []
+    for transcript in args.transcripts:
+        name = os.path.splitext(os.path.basename(transcript))[0]
+        analysis, report = reanalyze(
+            name,
+            transcript,
+            mode=args.mode,
+            state_dir=args.state_dir,
+            models=args.models,
+            batch_size=args.batch_size,
+            **_transformer_options(args),
+        )
+        report["top_emotions"] = {key: analysis.emotion_counts(key) for key in args.models}
+        reports.append(report)
+    return reports
+
+
+def cmd_cascade(args):
+    from cascade import cascade_report
+
+    return cascade_report(
+        args.transcripts,
+        mode=args.mode,
+        margin=args.margin,
+        nrc_min_words=args.nrc_min_words,
+        batch_size=args.batch_size,
+        **_model_options(args),
+    )
+
+
+def cmd_dedup(args):
+    from dedup import DEFAULT_NEAR_THRESHOLD, dedup_report
+
+    options = {"backend": args.backend, "long_segments": args.long_segments}
+    if args.token_budget is not None:
+        options["token_budget"] = args.token_budget
+    return dedup_report(
+        args.transcripts,
+        mode=args.mode,
+        near_threshold=args.near_threshold or DEFAULT_NEAR_THRESHOLD,
+        model=args.time_model,
+        batch_size=args.batch_size,
+        **options,
+    )
+
+
+def cmd_agreement(args):
+    from agreement import analyze_state_dir
+
+    return analyze_state_dir(args.state_dir, args.taxonomy, args.window)
+
+
+def cmd_serve(args):
+    from service import main as serve_main
+
+    serve_main(args.extra_args)
+
+
+def cmd_bench(args):
+    from benchmark import main as bench_main
+
+    bench_main(args.extra_args)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Emotion classification for speech transcripts.")
+    parser.add_argument("--offline", action="store_true", help="use only locally cached model weights")
+    parser.add_argument("--timing", action="store_true", help="print run time and which heavy modules were imported to stderr")
+    parser.add_argument("--stage-report", metavar="PATH", help="write per-stage timings (.json, or .prom for Prometheus)")
+    parser.add_argument("--torch-trace", metavar="PATH", help="record a torch.profiler Chrome trace of the run")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    score = commands.add_parser("score", help="score transcripts one by one, streaming results to disk")
+    score.add_argument("transcripts", nargs="+")
+    score.add_argument("-o", "--output-dir", default="scores")
+    _add_scoring_options(score)
+    score.set_defaults(func=cmd_score)
+
+    corpus = commands.add_parser("corpus", help="score a directory or manifest of transcripts on many processes")
+    corpus.add_argument("source", help="directory of .txt files or JSON Lines manifest")
+    corpus.add_argument("output_dir")
+    corpus.add_argument("--workers", type=int, default=None)
+    corpus.add_argument("--threads-per-worker", type=int, default=1)
+    _add_scoring_options(corpus)
+    corpus.set_defaults(func=cmd_corpus)
+
+    reanalyze = commands.add_parser("reanalyze", help="re-score only the segments that changed since the last run")
+    reanalyze.add_argument("transcripts", nargs="+")
+    reanalyze.add_argument("--state-dir", default="analysis_state")
+    reanalyze.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS))
+    _add_model_options(reanalyze)
+    reanalyze.set_defaults(func=cmd_reanalyze)
+
+    cascade = commands.add_parser("cascade", help="compare the NRC/DistilRoBERTa -> go_emotions cascade with a full run")
+    cascade.add_argument("transcripts", nargs="*", default=["milei_speech.txt", "von_der_leyen_cop28.txt", "tedros_speech.txt"])
+    cascade.add_argument("--margin", type=float, default=0.25, help="escalate below this top-1/top-2 probability gap")
+    cascade.add_argument("--nrc-min-words", type=int, default=2, help="lexicon matches before a disagreement counts")
+    _add_model_options(cascade)
+    cascade.set_defaults(func=cmd_cascade)
+
+    dedup = commands.add_parser("dedup", help="duplicate ratios of transcripts and the time dedup saves")
+    dedup.add_argument("transcripts", nargs="*", default=["milei_speech.txt", "von_der_leyen_cop28.txt", "tedros_speech.txt"])
+    dedup.add_argument("--time-model", choices=TRANSFORMER_MODELS, default=None, help="also time this model with and without dedup")
+    _add_model_options(dedup)
+    dedup.set_defaults(func=cmd_dedup)
+
+    agreement = commands.add_parser("agreement", help="cross-model agreement over the analyses stored by reanalyze")
+    agreement.add_argument("--state-dir", default="analysis_state")
+    agreement.add_argument("--taxonomy", nargs="+", choices=("ekman", "polarity"), default=["ekman", "polarity"])
+    agreement.add_argument("--window", type=int, default=10, help="segments per rolling emotion-flow window")
+    agreement.set_defaults(func=cmd_agreement)
+
+    # These two hand all their arguments, --help included, to their own parser
+    serve = commands.add_parser("serve", add_help=False, help="run the micro-batching HTTP service (see serve --help)")
+    serve.set_defaults(func=cmd_serve, passthrough=True)
+
+    bench = commands.add_parser("bench", add_help=False, help="throughput and latency benchmarks (see bench --help)")
+    bench.set_defaults(func=cmd_bench, passthrough=True)
+    return parser
+
+
+def main(argv=None):
+    start = time.perf_counter()
+    parser = build_parser()
+    args, extra_args = parser.parse_known_args(argv)
+    if getattr(args, "passthrough", False):
+        args.extra_args = extra_args
+    elif extra_args:
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+    if args.offline:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+    if args.torch_trace:
+        from profiling import torch_profile
+
+        with torch_profile(args.torch_trace):
+            report = args.func(args)
+    else:
+        report = args.func(args)
+    if args.stage_report:
+        from profiling import stage_timer
+
+        if args.stage_report.endswith(".prom"):
+            stage_timer.write_prometheus(args.stage_report)
+        else:
+            stage_timer.write_json(args.stage_report)
+    if report is not None:
+        print(json.dumps(report, indent=2))
+    if args.timing:
+        heavy = [name for name in ("torch", "transformers", "pandas", "matplotlib") if name in sys.modules]
+        print(
+            f"total {time.perf_counter() - start:.3f}s; heavy modules loaded: {', '.join(heavy) or 'none'}",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
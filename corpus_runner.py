@@ -0,0 +1,178 @@
+"""Score a whole corpus of transcripts on a pool of worker processes.
+
+Speeches come from a directory of .txt files or a JSON Lines manifest, one
+object per speech, for example:
+
+    {"path": "milei_speech.txt", "name": "milei", "mode": "paragraph"}
+    {"path": "tedros_speech.txt"}
+
+Each speech is segmented lazily and cut into chunks. The chunks are spread
+over the pool, with a bounded number in flight at any time. Every worker
+pins torch to threads_per_worker intra-op threads and loads its models once,
+in its initializer. Results are written per speech, in segment order, to
+<output_dir>/<name>.jsonl (or .parquet), so names must be unique. Workers
+given a cache_path share one SQLite cache file. Each worker holds its own copy of
+the models, so the memory limit sets the worker count:
+workers * threads_per_worker should not exceed the core count, and workers
+* (model memory per worker) must fit in RAM.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from inference import DEFAULT_BATCH_SIZE
+from streaming import DEFAULT_CHUNK_SIZE, iter_chunks, iter_segments, open_writer
+
+DEFAULT_MODELS = ("go_emotions", "distilroberta", "sentiment", "nrc")
+
+# Set in each worker process by _init_worker
+_scorers = None
+
+
+def read_corpus(source, mode="line"):
+    """List of {"path", "name", "mode"} dicts from a directory or manifest."""
+    source = Path(source)
+    if source.is_dir():
+        return [{"path": str(path), "name": path.stem, "mode": mode} for path in sorted(source.glob("*.txt"))]
+    speeches = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            path = Path(entry["path"])
+            if not path.is_absolute():
+                path = source.parent / path
+            speeches.append({
+                "path": str(path),
+                "name": entry.get("name", path.stem),
+                "mode": entry.get("mode", mode),
+            })
+    return speeches
+
+
+def default_workers(threads_per_worker=1):
+    return max((os.cpu_count() or 1) // threads_per_worker, 1)
+
+
+def _init_worker(models, threads_per_worker, batch_size, cache_path, options):
+    import torch
+
+    from prediction_cache import PredictionCache
+    from streaming import make_scorers
+
+    torch.set_num_threads(threads_per_worker)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set in this process
+    cache = PredictionCache(cache_path) if cache_path else None
+    global _scorers
+    _scorers = make_scorers(models, batch_size, cache, **options)
+
+
+def _score_chunk(name, start_index, chunk):
+    from streaming import score_chunk
+
+    start = time.perf_counter()
+    rows = score_chunk(chunk, _scorers, start_index)
+    return name, rows, os.getpid(), time.perf_counter() - start
+
+
+def _iter_tasks(speeches, chunk_size):
+    for speech in speeches:
+        start_index = 0
+        for chunk in iter_chunks(iter_segments(speech["path"], speech["mode"]), chunk_size):
+            yield speech["name"], start_index, chunk
+            start_index += len(chunk)
+
+
+def run_corpus(
+    source,
+    output_dir,
+    models=DEFAULT_MODELS,
+    workers=None,
+    threads_per_worker=1,
+    mode="line",
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    batch_size=DEFAULT_BATCH_SIZE,
+    output_format="jsonl",
+    cache_path=None,
+    **options,
+):
+    """Score every speech in source and return a throughput report."""
+    speeches = read_corpus(source, mode)
+    # One output file per name: a repeated name would overwrite an earlier speech
+    repeated = sorted(name for name, count in Counter(speech["name"] for speech in speeches).items() if count > 1)
+    if repeated:
+        raise ValueError(f"Speech names must be unique; repeated: {', '.join(repeated)}")
+    workers = workers or default_workers(threads_per_worker)
+    os.makedirs(output_dir, exist_ok=True)
+
+    per_worker = defaultdict(lambda: {"chunks": 0, "segments": 0, "busy_seconds": 0.0})
+    per_speech = defaultdict(int)
+    writer, writer_name = None, None
+    # Enough chunks in flight to keep every worker busy without reading ahead unboundedly
+    max_in_flight = 2 * workers
+    start = time.perf_counter()
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(tuple(models), threads_per_worker, batch_size, cache_path, options),
+    )
+    try:
+        pending = deque()
+        tasks = _iter_tasks(speeches, chunk_size)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                else:
+                    pending.append(executor.submit(_score_chunk, *task))
+            if not pending:
+                break
+            # Results are taken in submission order, so each speech is written in order
+            name, rows, pid, seconds = pending.popleft().result()
+            if name != writer_name:
+                if writer is not None:
+                    writer.close()
+                path = os.path.join(output_dir, f"{name}.{output_format}")
+                if os.path.exists(path):
+                    os.remove(path)
+                writer = open_writer(path)
+                writer_name = name
+            writer.write(rows)
+            stats = per_worker[pid]
+            stats["chunks"] += 1
+            stats["segments"] += len(rows)
+            stats["busy_seconds"] += seconds
+            per_speech[name] += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+        executor.shutdown(cancel_futures=True)
+
+    wall_seconds = time.perf_counter() - start
+    for stats in per_worker.values():
+        stats["segments_per_sec"] = round(stats["segments"] / stats["busy_seconds"], 1) if stats["busy_seconds"] else 0.0
+        stats["busy_seconds"] = round(stats["busy_seconds"], 3)
+    total = sum(per_speech.values())
+    return {
+        "speeches": len(speeches),
+        "segments": total,
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+        "wall_seconds": round(wall_seconds, 3),
+        "segments_per_sec": round(total / wall_seconds, 1) if wall_seconds else 0.0,
+        "per_worker": dict(per_worker),
+        "per_speech": dict(per_speech),
+    }
@@ -69,180 +69,204 @@ In his 2024 speech at the United Nations General Assembly, Argentine President J
 #### SamLowe/roberta-base-go_emotions
 """
 
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from model_registry import load_model, registry
 
-# Load tokenizer and model
-tokenizer = AutoTokenizer.from_pretrained("SamLowe/roberta-base-go_emotions")
-model = AutoModelForSequenceClassification.from_pretrained("SamLowe/roberta-base-go_emotions")
+# Inference backend: "eager" (fp32 PyTorch), "int8" (dynamic quantisation) or
+# "onnx" (ONNX Runtime); backends.parity_report shows how far int8/onnx drift from fp32
+BACKEND = "eager"
+
+# Load tokenizer and model (loaded once and shared by every speech)
+go_tokenizer, go_model = load_model("SamLowe/roberta-base-go_emotions", backend=BACKEND)
 
 # Load the speech transcript
 with open('milei_speech.txt', 'r', encoding='utf-8') as file:
     speech_text = file.read()
 
-# Split speech into paragraphs
-segments = speech_text.split('\n\n')  # Adjust the delimiter as needed
+from streaming import split_segments
+
+# Split speech into paragraphs; a segment's ID is its position in this list
+segments = split_segments(speech_text, "paragraph")
+
+from inference import DEFAULT_BATCH_SIZE
+from prediction_cache import PredictionCache
+from profiling import stage, stage_timer
+from results import ProbabilityMatrix, concat_columns
+from scheduler import DEFAULT_TOKEN_BUDGET, padding_stats
+
+# Segments per forward pass; each batch is padded only to its longest segment
+BATCH_SIZE = DEFAULT_BATCH_SIZE
+
+# Segments are bucketed by token length and packed into batches of at most this
+# many padded tokens, then put back in their original order. Set to None to
+# batch BATCH_SIZE segments in file order instead.
+TOKEN_BUDGET = DEFAULT_TOKEN_BUDGET
+
+# Paragraphs longer than the 512-token model context are truncated, as in the
+# original notebook and every other entry point. Use
+# {"long_segments": "window", "window_reduction": "mean"} to score them as
+# overlapping windows instead; see README "Long segments" for cost and drift.
+LONG_SEGMENT_OPTIONS = {"long_segments": "truncate"}
 
-import torch
-import torch.nn.functional as F
+# Settings that change the scores, so they are part of every cache key
+CACHE_PARAMS = dict(LONG_SEGMENT_OPTIONS, backend=BACKEND)
+
+# Scores are cached on disk, so re-running the notebook only scores new segments
+prediction_cache = PredictionCache("emotion_cache.sqlite")
+
+# The three classifiers share one RoBERTa tokenizer, so a segment is tokenized
+# once and the DistilRoBERTa and sentiment models read the same padded batches
+from shared_inference import SharedInference, tokenization_stats
+
+shared_inference = SharedInference(
+    ["go_emotions", "distilroberta", "sentiment"], BATCH_SIZE, backend=BACKEND, token_budget=TOKEN_BUDGET, **LONG_SEGMENT_OPTIONS
+)
 
 # Get model's label mappings
-id2label = model.config.id2label
-
-results = []
-
-for segment in segments:
-    if segment.strip():  # Ensure the segment is not empty
-        # Tokenize the segment
-        inputs = tokenizer(segment, return_tensors="pt", truncation=True, padding=True)
-        # Get model predictions
-        with torch.no_grad():
-            logits = model(**inputs).logits
-        # Apply sigmoid to get probabilities
-        probs = F.sigmoid(logits.squeeze())
-        # Filter labels with probability above a certain threshold (e.g., 0.5)
-        threshold = 0.5
-        predicted_labels = [id2label[i] for i, prob in enumerate(probs) if prob > threshold]
-        # Store results
-        results.append({
-            'Segment': segment,
-            'Predicted Emotions': predicted_labels,
-            'Emotion Probabilities': {id2label[i]: prob.item() for i, prob in enumerate(probs)}
-        })
+go_id2label = go_model.config.id2label
+
+# Filter labels with probability above a certain threshold (e.g., 0.5)
+threshold = 0.5
+
+# Get sigmoid probabilities in dynamically padded batches, reusing cached
+# scores for segments that were already scored in an earlier run
+with stage("go_emotions"):
+    segment_probs = prediction_cache.probs(
+        segments,
+        "SamLowe/roberta-base-go_emotions",
+        lambda batch: shared_inference.predict("go_emotions", batch),
+        threshold=threshold,
+        **CACHE_PARAMS,
+    )
+
+# Keep the probabilities as one float32 (segments x labels) matrix
+go_labels = [go_id2label[i] for i in range(len(go_id2label))]
+javier_go_results = ProbabilityMatrix(segment_probs, go_labels)
+predicted_emotions = javier_go_results.labels_above(threshold)
 
 # Display results
-for result in results:
-    print(f"Segment: {result['Segment']}")
-    print(f"Predicted Emotions: {result['Predicted Emotions']}")
-    print(f"Emotion Probabilities: {result['Emotion Probabilities']}")
+for row, segment in enumerate(segments):
+    print(f"Segment: {segment}")
+    print(f"Predicted Emotions: {predicted_emotions[row]}")
+    print(f"Emotion Probabilities: {javier_go_results.row_dict(row)}")
     print('-' * 50)
 
 """#### j-hartmann/emotion-english-distilroberta-base"""
 
+# Load and segment Javier transcript
+with open("milei_speech.txt", "r", encoding="utf-8") as file:
+    javier_transcript = file.read()
+javier_segments = split_segments(javier_transcript, "line")
+
 # Load the DistilRoBERTa-based emotion model
 emotion_model_name = "j-hartmann/emotion-english-distilroberta-base"
-emotion_tokenizer = AutoTokenizer.from_pretrained(emotion_model_name)
-emotion_model = AutoModelForSequenceClassification.from_pretrained(emotion_model_name)
+emotion_tokenizer, emotion_model = load_model(emotion_model_name, backend=BACKEND)
 
 # Get emotion label map
-id2label = emotion_model.config.id2label
-label_list = list(id2label.values())
+emotion_id2label = emotion_model.config.id2label
+label_list = list(emotion_id2label.values())
 
 # Emotion classification function using DistilRoBERTa
 def get_distilroberta_emotions(texts):
-    results = []
-    for text in texts:
-        inputs = emotion_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        with torch.no_grad():
-            logits = emotion_model(**inputs).logits
-        probs = torch.nn.functional.softmax(logits, dim=-1).numpy()[0]
-        top_emotion = label_list[np.argmax(probs)]
-        result = {
-            "text": text,
-            "top_emotion": top_emotion
-        }
-        for label, prob in zip(label_list, probs):
-            result[label] = round(prob, 4)
-        results.append(result)
-    return pd.DataFrame(results)
+    with stage("get_distilroberta_emotions"):
+        texts = list(texts)
+        all_probs = prediction_cache.probs(
+            texts,
+            emotion_model_name,
+            lambda batch: shared_inference.predict("distilroberta", batch),
+            **CACHE_PARAMS,
+        )
+        matrix = ProbabilityMatrix(all_probs, label_list)
+        emotion_df = matrix.to_frame(decimals=4)
+        emotion_df.insert(0, "text", texts)
+        emotion_df.insert(1, "top_emotion", matrix.top_labels())
+        return emotion_df
 
 # Run DistilRoBERTa on Javier speech
 javier_emotion_df = get_distilroberta_emotions(javier_segments)
 
 # Preview
 print("Javier Transcript Emotion Output:")
-display(javier_emotion_df.head())
+print(javier_emotion_df.head())
 
 """#### Sentiment Analysis"""
 
-!pip install nrclex
-
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from nrclex import NRCLex
-import torch
+# The NRC word list ships with nrclex: pip install nrclex
+from nrc_lexicon import get_lexicon
 import pandas as pd
-import numpy as np
 from collections import Counter
 
+# NRC word -> emotion table, loaded once into a sparse matrix (runs offline)
+nrc_lexicon = get_lexicon()
+
 # Load Javier Transcript
 with open("milei_speech.txt", "r", encoding="utf-8") as file:
     javier_transcript = file.read()
 
 # Segment transcript into meaningful chunks
-javier_segments = [seg.strip() for seg in javier_transcript.split("\n") if len(seg.strip()) > 30]
+javier_segments = split_segments(javier_transcript, "line")
 
 # Load sentiment analysis model (3-class)
 sentiment_model_name = "cardiffnlp/twitter-roberta-base-sentiment"
-sentiment_tokenizer = AutoTokenizer.from_pretrained(sentiment_model_name)
-sentiment_model = AutoModelForSequenceClassification.from_pretrained(sentiment_model_name)
+sentiment_tokenizer, sentiment_model = load_model(sentiment_model_name, backend=BACKEND)
 sentiment_labels = ['negative', 'neutral', 'positive']
 
 # Sentiment analysis function
 def get_sentiment_scores(texts):
-    scores = []
-    for text in texts:
-        inputs = sentiment_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        with torch.no_grad():
-            logits = sentiment_model(**inputs).logits
-        probabilities = torch.nn.functional.softmax(logits, dim=-1).numpy()[0]
-        sentiment = sentiment_labels[np.argmax(probabilities)]
-        scores.append({
-            "text": text,
-            "negative": round(probabilities[0], 3),
-            "neutral": round(probabilities[1], 3),
-            "positive": round(probabilities[2], 3),
-            "sentiment": sentiment
-        })
-    return pd.DataFrame(scores)
-
-# Lexicon-based emotion function
+    with stage("get_sentiment_scores"):
+        texts = list(texts)
+        all_probabilities = prediction_cache.probs(
+            texts,
+            sentiment_model_name,
+            lambda batch: shared_inference.predict("sentiment", batch),
+            **CACHE_PARAMS,
+        )
+        matrix = ProbabilityMatrix(all_probabilities, sentiment_labels)
+        sentiment_df = matrix.to_frame(decimals=3)
+        sentiment_df.insert(0, "text", texts)
+        sentiment_df["sentiment"] = matrix.top_labels()
+        return sentiment_df
+
+# Lexicon-based emotion function (whole batch scored with one sparse matrix product)
 def get_nrc_emotions(texts):
-    import nltk  # Import nltk here
-
-    # Download required NLTK data
-    nltk.download('punkt_tab', quiet=True)  # Download punkt_tab data, suppress download messages
-    nltk.download('punkt', quiet=True)      # Download punkt data, suppress download messages
-
-    results = []
-    for text in texts:
-        emotion_obj = NRCLex(text)
-        raw_scores = emotion_obj.raw_emotion_scores
-        top_emotions = emotion_obj.top_emotions
-        result = {
-            "text": text,
-            "raw_scores": raw_scores,
-            "top_emotions": top_emotions
-        }
-        result.update(Counter(raw_scores))
-        results.append(result)
-    return pd.DataFrame(results)
+    with stage("get_nrc_emotions"):
+        texts = list(texts)
+        results = []
+        for text, scored in zip(texts, prediction_cache.records(texts, "nrc_lexicon", nrc_lexicon.score, **nrc_lexicon.cache_params)):
+            raw_scores = scored["raw_scores"]
+            top_emotions = [tuple(pair) for pair in scored["top_emotions"]]
+            result = {
+                "text": text,
+                "raw_scores": raw_scores,
+                "top_emotions": top_emotions
+            }
+            result.update(Counter(raw_scores))
+            results.append(result)
+        return pd.DataFrame(results, index=pd.RangeIndex(len(results), name="segment_id"))
 
 # Run both analyses
 javier_sentiment_df = get_sentiment_scores(javier_segments)
 javier_lexicon_df = get_nrc_emotions(javier_segments)
 
-# Merge dataframes on text segment
-javier_combined_df = pd.merge(javier_sentiment_df, javier_lexicon_df, on="text")
+# Both frames are indexed by segment ID, so combining them is a column concatenation
+javier_combined_df = concat_columns(javier_sentiment_df, javier_lexicon_df)
 
 # Preview the combined data
-javier_combined_df.head()
+print(javier_combined_df.head())
 
 """### Evaluation Analysis (needs work)"""
 
-import pandas as pd
 import matplotlib.pyplot as plt
 
-# Convert results to DataFrame
-df = pd.DataFrame(results)
-
-# Extract the most probable emotion for each segment
-df['Top Emotion'] = df['Emotion Probabilities'].apply(lambda x: max(x, key=x.get) if x else None)
+# Most probable emotion for each segment, taken from the probability matrix in one call
+df = pd.DataFrame({'Top Emotion': javier_go_results.top_labels()}, index=javier_go_results.segment_ids)
 
 # Now you can use 'Top Emotion' column for plotting
 emotion_counts = df['Top Emotion'].value_counts()
-emotion_counts.plot(kind='bar', figsize=(10, 5), title="Emotion Frequency in Speech")
-plt.xlabel("Emotion")
-plt.ylabel("Count")
-plt.show()
+with stage("plot"):
+    emotion_counts.plot(kind='bar', figsize=(10, 5), title="Emotion Frequency in Speech")
+    plt.xlabel("Emotion")
+    plt.ylabel("Count")
+    plt.show()
 
 # Plot emotions across segments
 df['Segment #'] = range(len(df))
@@ -250,10 +274,39 @@ df['Segment #'] = range(len(df))
 df['Top Emotion Code'] = pd.Categorical(df['Top Emotion']).codes
 
 # Plot using the numerical codes
-df.set_index('Segment #')['Top Emotion Code'].plot(marker='o', title="Emotion Flow Across Speech", figsize=(12, 4))
-plt.ylabel("Emotion Code") # Update y-axis label
-plt.yticks(df['Top Emotion Code'].unique(), df['Top Emotion'].unique()) # Set y-ticks to original emotion labels
-plt.show()
+with stage("plot"):
+    df.set_index('Segment #')['Top Emotion Code'].plot(marker='o', title="Emotion Flow Across Speech", figsize=(12, 4))
+    plt.ylabel("Emotion Code") # Update y-axis label
+    plt.yticks(df['Top Emotion Code'].unique(), df['Top Emotion'].unique()) # Set y-ticks to original emotion labels
+    plt.show()
+
+"""#### Cross-model agreement"""
+
+from agreement import AgreementAnalysis
+from nrc_lexicon import EMOTIONS
+
+# Every model's scores for the same Milei segments, in segment order
+javier_scores = {
+    "go_emotions": javier_go_results.probs,
+    "distilroberta": javier_emotion_df[label_list].to_numpy(),
+    "sentiment": javier_sentiment_df[sentiment_labels].to_numpy(),
+    "nrc": nrc_lexicon.raw_scores(javier_segments),
+}
+javier_labels = {"go_emotions": go_labels, "distilroberta": label_list, "sentiment": sentiment_labels, "nrc": EMOTIONS}
+
+# Ekman emotions for the emotion models, negative/neutral/positive for all four
+for taxonomy in ("ekman", "polarity"):
+    agreement = AgreementAnalysis(javier_labels, taxonomy)
+    agreement.update(javier_scores, speech="milei")
+    agreement_report = agreement.report()
+    print(f"{taxonomy}: models compared {agreement_report['models']}")
+    for pair, stats in agreement_report["pairs"].items():
+        print(f"  {pair}: agreement {stats['agreement']}, kappa {stats['kappa']}, JS divergence {stats['divergence']}")
+    print(pd.DataFrame(
+        agreement.confusion_matrix("go_emotions", "distilroberta"),
+        index=agreement.categories,
+        columns=agreement.categories,
+    ))
 
 """# Environmental (Ursula von der Leyen)
 
@@ -267,43 +320,38 @@ In her 2023 speech at the COP28 Climate Summit in Dubai, European Commission Pre
 with open("von_der_leyen_cop28.txt", "r", encoding="utf-8") as file:
     transcript = file.read()
 
-segments = [seg.strip() for seg in transcript.split("\n") if len(seg.strip()) > 30]
-
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+segments = split_segments(transcript, "line")
 
-# Load tokenizer and model
-tokenizer = AutoTokenizer.from_pretrained("SamLowe/roberta-base-go_emotions")
-model = AutoModelForSequenceClassification.from_pretrained("SamLowe/roberta-base-go_emotions")
+# Get the shared tokenizer and model (already loaded for the Milei speech)
+go_tokenizer, go_model = load_model("SamLowe/roberta-base-go_emotions", backend=BACKEND)
 
 # Get model's label mappings
-id2label = model.config.id2label
-
-results = []
-
-for segment in segments:
-    if segment.strip():  # Ensure the segment is not empty
-        # Tokenize the segment
-        inputs = tokenizer(segment, return_tensors="pt", truncation=True, padding=True)
-        # Get model predictions
-        with torch.no_grad():
-            logits = model(**inputs).logits
-        # Apply sigmoid to get probabilities
-        probs = F.sigmoid(logits.squeeze())
-        # Filter labels with probability above a certain threshold (e.g., 0.5)
-        threshold = 0.5
-        predicted_labels = [id2label[i] for i, prob in enumerate(probs) if prob > threshold]
-        # Store results
-        results.append({
-            'Segment': segment,
-            'Predicted Emotions': predicted_labels,
-            'Emotion Probabilities': {id2label[i]: prob.item() for i, prob in enumerate(probs)}
-        })
+go_id2label = go_model.config.id2label
+
+# Filter labels with probability above a certain threshold (e.g., 0.5)
+threshold = 0.5
+
+# Get sigmoid probabilities in dynamically padded batches, reusing cached
+# scores for segments that were already scored in an earlier run
+with stage("go_emotions"):
+    segment_probs = prediction_cache.probs(
+        segments,
+        "SamLowe/roberta-base-go_emotions",
+        lambda batch: shared_inference.predict("go_emotions", batch),
+        threshold=threshold,
+        **CACHE_PARAMS,
+    )
+
+# Keep the probabilities as one float32 (segments x labels) matrix
+go_labels = [go_id2label[i] for i in range(len(go_id2label))]
+leyen_go_results = ProbabilityMatrix(segment_probs, go_labels)
+predicted_emotions = leyen_go_results.labels_above(threshold)
 
 # Display results
-for result in results:
-    print(f"Segment: {result['Segment']}")
-    print(f"Predicted Emotions: {result['Predicted Emotions']}")
-    print(f"Emotion Probabilities: {result['Emotion Probabilities']}")
+for row, segment in enumerate(segments):
+    print(f"Segment: {segment}")
+    print(f"Predicted Emotions: {predicted_emotions[row]}")
+    print(f"Emotion Probabilities: {leyen_go_results.row_dict(row)}")
     print('-' * 50)
 
 """#### j-hartmann/emotion-english-distilroberta-base"""
@@ -311,41 +359,38 @@ for result in results:
 # Load and segment von der Leyen transcript
 with open("von_der_leyen_cop28.txt", "r", encoding="utf-8") as file:
     von_transcript = file.read()
-von_segments = [seg.strip() for seg in von_transcript.split("\n") if len(seg.strip()) > 30]
+von_segments = split_segments(von_transcript, "line")
 
 # Load the DistilRoBERTa-based emotion model
 emotion_model_name = "j-hartmann/emotion-english-distilroberta-base"
-emotion_tokenizer = AutoTokenizer.from_pretrained(emotion_model_name)
-emotion_model = AutoModelForSequenceClassification.from_pretrained(emotion_model_name)
+emotion_tokenizer, emotion_model = load_model(emotion_model_name, backend=BACKEND)
 
 # Get emotion label map
-id2label = emotion_model.config.id2label
-label_list = list(id2label.values())
+emotion_id2label = emotion_model.config.id2label
+label_list = list(emotion_id2label.values())
 
 # Emotion classification function using DistilRoBERTa
 def get_distilroberta_emotions(texts):
-    results = []
-    for text in texts:
-        inputs = emotion_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        with torch.no_grad():
-            logits = emotion_model(**inputs).logits
-        probs = torch.nn.functional.softmax(logits, dim=-1).numpy()[0]
-        top_emotion = label_list[np.argmax(probs)]
-        result = {
-            "text": text,
-            "top_emotion": top_emotion
-        }
-        for label, prob in zip(label_list, probs):
-            result[label] = round(prob, 4)
-        results.append(result)
-    return pd.DataFrame(results)
+    with stage("get_distilroberta_emotions"):
+        texts = list(texts)
+        all_probs = prediction_cache.probs(
+            texts,
+            emotion_model_name,
+            lambda batch: shared_inference.predict("distilroberta", batch),
+            **CACHE_PARAMS,
+        )
+        matrix = ProbabilityMatrix(all_probs, label_list)
+        emotion_df = matrix.to_frame(decimals=4)
+        emotion_df.insert(0, "text", texts)
+        emotion_df.insert(1, "top_emotion", matrix.top_labels())
+        return emotion_df
 
 # Run DistilRoBERTa on von der Leyen speech
 von_emotion_df = get_distilroberta_emotions(von_segments)
 
 # Preview
 print("Von der Leyen Transcript Emotion Output:")
-display(von_emotion_df.head())
+print(von_emotion_df.head())
 
 """#### Sentiment Analysis"""
 
@@ -354,63 +399,55 @@ with open("von_der_leyen_cop28.txt", "r", encoding="utf-8") as file:
     leyen_transcript = file.read()
 
 # Segment transcript into meaningful chunks
-leyen_segments = [seg.strip() for seg in leyen_transcript.split("\n") if len(seg.strip()) > 30]
+leyen_segments = split_segments(leyen_transcript, "line")
 
 # Load sentiment analysis model (3-class)
 sentiment_model_name = "cardiffnlp/twitter-roberta-base-sentiment"
-sentiment_tokenizer = AutoTokenizer.from_pretrained(sentiment_model_name)
-sentiment_model = AutoModelForSequenceClassification.from_pretrained(sentiment_model_name)
+sentiment_tokenizer, sentiment_model = load_model(sentiment_model_name, backend=BACKEND)
 sentiment_labels = ['negative', 'neutral', 'positive']
 
 # Sentiment analysis function
 def get_sentiment_scores(texts):
-    scores = []
-    for text in texts:
-        inputs = sentiment_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        with torch.no_grad():
-            logits = sentiment_model(**inputs).logits
-        probabilities = torch.nn.functional.softmax(logits, dim=-1).numpy()[0]
-        sentiment = sentiment_labels[np.argmax(probabilities)]
-        scores.append({
-            "text": text,
-            "negative": round(probabilities[0], 3),
-            "neutral": round(probabilities[1], 3),
-            "positive": round(probabilities[2], 3),
-            "sentiment": sentiment
-        })
-    return pd.DataFrame(scores)
-
-# Lexicon-based emotion function
+    with stage("get_sentiment_scores"):
+        texts = list(texts)
+        all_probabilities = prediction_cache.probs(
+            texts,
+            sentiment_model_name,
+            lambda batch: shared_inference.predict("sentiment", batch),
+            **CACHE_PARAMS,
+        )
+        matrix = ProbabilityMatrix(all_probabilities, sentiment_labels)
+        sentiment_df = matrix.to_frame(decimals=3)
+        sentiment_df.insert(0, "text", texts)
+        sentiment_df["sentiment"] = matrix.top_labels()
+        return sentiment_df
+
+# Lexicon-based emotion function (whole batch scored with one sparse matrix product)
 def get_nrc_emotions(texts):
-    import nltk  # Import nltk here
-
-    # Download required NLTK data
-    nltk.download('punkt_tab', quiet=True)  # Download punkt_tab data, suppress download messages
-    nltk.download('punkt', quiet=True)      # Download punkt data, suppress download messages
-
-    results = []
-    for text in texts:
-        emotion_obj = NRCLex(text)
-        raw_scores = emotion_obj.raw_emotion_scores
-        top_emotions = emotion_obj.top_emotions
-        result = {
-            "text": text,
-            "raw_scores": raw_scores,
-            "top_emotions": top_emotions
-        }
-        result.update(Counter(raw_scores))
-        results.append(result)
-    return pd.DataFrame(results)
+    with stage("get_nrc_emotions"):
+        texts = list(texts)
+        results = []
+        for text, scored in zip(texts, prediction_cache.records(texts, "nrc_lexicon", nrc_lexicon.score, **nrc_lexicon.cache_params)):
+            raw_scores = scored["raw_scores"]
+            top_emotions = [tuple(pair) for pair in scored["top_emotions"]]
+            result = {
+                "text": text,
+                "raw_scores": raw_scores,
+                "top_emotions": top_emotions
+            }
+            result.update(Counter(raw_scores))
+            results.append(result)
+        return pd.DataFrame(results, index=pd.RangeIndex(len(results), name="segment_id"))
 
 # Run both analyses
 leyen_sentiment_df = get_sentiment_scores(leyen_segments)
 leyen_lexicon_df = get_nrc_emotions(leyen_segments)
 
-# Merge dataframes on text segment
-leyen_combined_df = pd.merge(leyen_sentiment_df, leyen_lexicon_df, on="text")
+# Both frames are indexed by segment ID, so combining them is a column concatenation
+leyen_combined_df = concat_columns(leyen_sentiment_df, leyen_lexicon_df)
 
 # Preview the combined data
-leyen_combined_df.head()
+print(leyen_combined_df.head())
 
 """# Healthcare (Dr. Tedros Adhanom Ghebreyesus)
 
@@ -426,37 +463,32 @@ with open("tedros_speech.txt", "r", encoding="utf-8") as file:
     transcript = file.read()
 
 # Segment the transcript
-segments = [seg.strip() for seg in transcript.split("\n") if len(seg.strip()) > 30]
+segments = split_segments(transcript, "line")
 
-# Load model and tokenizer
-model_name = "SamLowe/roberta-base-go_emotions"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSequenceClassification.from_pretrained(model_name)
+# Get the shared model and tokenizer
+go_tokenizer, go_model = load_model("SamLowe/roberta-base-go_emotions", backend=BACKEND)
 
 # Get id2label mapping
-id2label = model.config.id2label
-
-results = []
+go_id2label = go_model.config.id2label
 
-for segment in segments:
-    if segment.strip():
-        inputs = tokenizer(segment, return_tensors="pt", truncation=True, padding=True)
-        with torch.no_grad():
-            logits = model(**inputs).logits
-        probs = F.sigmoid(logits.squeeze())
-        predicted_labels = [id2label[i] for i, prob in enumerate(probs) if prob > threshold]
+with stage("go_emotions"):
+    segment_probs = prediction_cache.probs(
+        segments,
+        "SamLowe/roberta-base-go_emotions",
+        lambda batch: shared_inference.predict("go_emotions", batch),
+        threshold=threshold,
+        **CACHE_PARAMS,
+    )
 
-        results.append({
-            'Segment': segment,
-            'Predicted Emotions': predicted_labels,
-            'Emotion Probabilities': {id2label[i]: round(prob.item(), 3) for i, prob in enumerate(probs)}
-        })
+go_labels = [go_id2label[i] for i in range(len(go_id2label))]
+tedros_go_results = ProbabilityMatrix(segment_probs, go_labels)
+predicted_emotions = tedros_go_results.labels_above(threshold)
 
 # Display the results
-for result in results:
-    print(f"Segment: {result['Segment']}")
-    print(f"Predicted Emotions: {result['Predicted Emotions']}")
-    print(f"Emotion Probabilities: {result['Emotion Probabilities']}")
+for row, segment in enumerate(segments):
+    print(f"Segment: {segment}")
+    print(f"Predicted Emotions: {predicted_emotions[row]}")
+    print(f"Emotion Probabilities: {tedros_go_results.row_dict(row, decimals=3)}")
     print('-' * 50)
 
 """#### j-hartmann/emotion-english-distilroberta-base"""
@@ -464,41 +496,38 @@ for result in results:
 # Load and segment Healthcare transcript (Tedros speech)
 with open("tedros_speech.txt", "r", encoding="utf-8") as file:
     tedros_transcript = file.read()
-tedros_segments = [seg.strip() for seg in tedros_transcript.split("\n") if len(seg.strip()) > 30]
+tedros_segments = split_segments(tedros_transcript, "line")
 
 # Load the DistilRoBERTa-based emotion model
 emotion_model_name = "j-hartmann/emotion-english-distilroberta-base"
-emotion_tokenizer = AutoTokenizer.from_pretrained(emotion_model_name)
-emotion_model = AutoModelForSequenceClassification.from_pretrained(emotion_model_name)
+emotion_tokenizer, emotion_model = load_model(emotion_model_name, backend=BACKEND)
 
 # Get emotion label map
-id2label = emotion_model.config.id2label
-label_list = list(id2label.values())
+emotion_id2label = emotion_model.config.id2label
+label_list = list(emotion_id2label.values())
 
 # Emotion classification function using DistilRoBERTa
 def get_distilroberta_emotions(texts):
-    results = []
-    for text in texts:
-        inputs = emotion_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        with torch.no_grad():
-            logits = emotion_model(**inputs).logits
-        probs = torch.nn.functional.softmax(logits, dim=-1).numpy()[0]
-        top_emotion = label_list[np.argmax(probs)]
-        result = {
-            "text": text,
-            "top_emotion": top_emotion
-        }
-        for label, prob in zip(label_list, probs):
-            result[label] = round(prob, 4)
-        results.append(result)
-    return pd.DataFrame(results)
+    with stage("get_distilroberta_emotions"):
+        texts = list(texts)
+        all_probs = prediction_cache.probs(
+            texts,
+            emotion_model_name,
+            lambda batch: shared_inference.predict("distilroberta", batch),
+            **CACHE_PARAMS,
+        )
+        matrix = ProbabilityMatrix(all_probs, label_list)
+        emotion_df = matrix.to_frame(decimals=4)
+        emotion_df.insert(0, "text", texts)
+        emotion_df.insert(1, "top_emotion", matrix.top_labels())
+        return emotion_df
 
 # Run DistilRoBERTa on the Tedros healthcare speech
 tedros_emotion_df = get_distilroberta_emotions(tedros_segments)
 
 # Preview
 print("Tedros Healthcare Transcript Emotion Output:")
-display(tedros_emotion_df.head())
+print(tedros_emotion_df.head())
 
 """#### Sentiment Analysis"""
 
@@ -507,60 +536,67 @@ with open("tedros_speech.txt", "r", encoding="utf-8") as file:
     tedros_transcript = file.read()
 
 # Segment transcript into meaningful chunks
-tedros_segments = [seg.strip() for seg in tedros_transcript.split("\n") if len(seg.strip()) > 30]
+tedros_segments = split_segments(tedros_transcript, "line")
 
 # Load sentiment analysis model (3-class)
 sentiment_model_name = "cardiffnlp/twitter-roberta-base-sentiment"
-sentiment_tokenizer = AutoTokenizer.from_pretrained(sentiment_model_name)
-sentiment_model = AutoModelForSequenceClassification.from_pretrained(sentiment_model_name)
+sentiment_tokenizer, sentiment_model = load_model(sentiment_model_name, backend=BACKEND)
 sentiment_labels = ['negative', 'neutral', 'positive']
 
 # Sentiment analysis function
 def get_sentiment_scores(texts):
-    scores = []
-    for text in texts:
-        inputs = sentiment_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        with torch.no_grad():
-            logits = sentiment_model(**inputs).logits
-        probabilities = torch.nn.functional.softmax(logits, dim=-1).numpy()[0]
-        sentiment = sentiment_labels[np.argmax(probabilities)]
-        scores.append({
-            "text": text,
-            "negative": round(probabilities[0], 3),
-            "neutral": round(probabilities[1], 3),
-            "positive": round(probabilities[2], 3),
-            "sentiment": sentiment
-        })
-    return pd.DataFrame(scores)
-
-# Lexicon-based emotion function
+    with stage("get_sentiment_scores"):
+        texts = list(texts)
+        all_probabilities = prediction_cache.probs(
+            texts,
+            sentiment_model_name,
+            lambda batch: shared_inference.predict("sentiment", batch),
+            **CACHE_PARAMS,
+        )
+        matrix = ProbabilityMatrix(all_probabilities, sentiment_labels)
+        sentiment_df = matrix.to_frame(decimals=3)
+        sentiment_df.insert(0, "text", texts)
+        sentiment_df["sentiment"] = matrix.top_labels()
+        return sentiment_df
+
+# Lexicon-based emotion function (whole batch scored with one sparse matrix product)
 def get_nrc_emotions(texts):
-    import nltk  # Import nltk here
-
-    # Download required NLTK data
-    nltk.download('punkt_tab', quiet=True)  # Download punkt_tab data, suppress download messages
-    nltk.download('punkt', quiet=True)      # Download punkt data, suppress download messages
-
-    results = []
-    for text in texts:
-        emotion_obj = NRCLex(text)
-        raw_scores = emotion_obj.raw_emotion_scores
-        top_emotions = emotion_obj.top_emotions
-        result = {
-            "text": text,
-            "raw_scores": raw_scores,
-            "top_emotions": top_emotions
-        }
-        result.update(Counter(raw_scores))
-        results.append(result)
-    return pd.DataFrame(results)
+    with stage("get_nrc_emotions"):
+        texts = list(texts)
+        results = []
+        for text, scored in zip(texts, prediction_cache.records(texts, "nrc_lexicon", nrc_lexicon.score, **nrc_lexicon.cache_params)):
+            raw_scores = scored["raw_scores"]
+            top_emotions = [tuple(pair) for pair in scored["top_emotions"]]
+            result = {
+                "text": text,
+                "raw_scores": raw_scores,
+                "top_emotions": top_emotions
+            }
+            result.update(Counter(raw_scores))
+            results.append(result)
+        return pd.DataFrame(results, index=pd.RangeIndex(len(results), name="segment_id"))
 
 # Run both analyses
 tedros_sentiment_df = get_sentiment_scores(tedros_segments)
 tedros_lexicon_df = get_nrc_emotions(tedros_segments)
 
-# Merge dataframes on text segment
-tedros_combined_df = pd.merge(tedros_sentiment_df, tedros_lexicon_df, on="text")
+# Both frames are indexed by segment ID, so combining them is a column concatenation
+tedros_combined_df = concat_columns(tedros_sentiment_df, tedros_lexicon_df)
 
 # Preview the combined data
-tedros_combined_df.head()
\ No newline at end of file
+print(tedros_combined_df.head())
+
+"""# Model Loading and Cache
+
+Each checkpoint is loaded once and shared by all three speeches. Padding efficiency is the share of token positions in each forward pass that held real tokens rather than padding. On a re-run over unchanged transcripts every segment is a cache hit and no forward passes are made.
+
+Every stage above (tokenisation, forward passes, activation, NRC scoring, DataFrame construction, combining and plotting, nested under the function or model that ran it) is timed. The timings are saved as JSON and as a Prometheus text file for regression tracking.
+"""
+
+print(pd.DataFrame(registry.stats()))
+print(prediction_cache.stats())
+print(padding_stats.report())
+print(tokenization_stats.report())
+print(pd.DataFrame(stage_timer.report()).T)
+stage_timer.write_json("stage_timings.json")
+stage_timer.write_prometheus("stage_timings.prom")
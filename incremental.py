@@ -0,0 +1,216 @@
+"""Incremental re-analysis of edited transcripts.
+
+Each speech's last analysis is stored in <state_dir>/<speech>.npz: one
+16-byte hash per segment, the score matrix of every model aligned with the
+segments, each segment's top emotion per model (the emotion flow series),
+and per-model counts of top emotions (the emotion frequency bars of the
+evaluation section).
+
+reanalyze() segments the new transcript and diffs its hashes against the
+stored ones with difflib. Only inserted or changed segments are scored. The
+scores of unchanged segments are copied across, and the frequency counts are
+adjusted by the segments that left and the ones that came in rather than
+recounted. The model cost is therefore proportional to the size of the edit.
+A change of models or scoring options, or of the NRC word list or
+lemmatiser, invalidates the stored state and triggers a full run.
+
+    from incremental import reanalyze
+    analysis, report = reanalyze("milei", "milei_speech.txt")
+    analysis.emotion_counts("go_emotions")
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from inference import DEFAULT_BATCH_SIZE
+
+DEFAULT_STATE_DIR = "analysis_state"
+MODELS = ("go_emotions", "distilroberta", "sentiment", "nrc")
+
+
+def segment_hashes(segments):
+    """16-byte BLAKE2 digest of every segment, as an "S16" array."""
+    return np.array([hashlib.blake2b(s.encode("utf-8"), digest_size=16).digest() for s in segments], dtype="S16")
+
+
+def score_functions(models, batch_size=DEFAULT_BATCH_SIZE, **options):
+    """{key: (labels, texts -> (texts x labels) array)} for the selected models.
+
+    Transformer models with matching tokenizers share one tokenization pass.
+    """
+    functions = {}
+    keys = [key for key in models if key != "nrc"]
+    if keys:
+        from inference import MODEL_SPECS
+        from shared_inference import SharedInference
+        from streaming import model_labels
+
+        shared = SharedInference(keys, batch_size, **options)
+    for key in models:
+        if key == "nrc":
+            from nrc_lexicon import EMOTIONS, get_lexicon
+
+            functions[key] = (list(EMOTIONS), get_lexicon().raw_scores)
+            continue
+        model = shared.models[key][0]
+        functions[key] = (model_labels(model, MODEL_SPECS[key]), shared.predictor(key))
+    return functions
+
+
+def top_indices(scores):
+    """Top label per segment; -1 where every score is zero (no NRC words matched)."""
+    if not len(scores):
+        return np.empty(0, dtype=np.int16)
+    top = scores.argmax(axis=1).astype(np.int16)
+    top[~scores.any(axis=1)] = -1
+    return top
+
+
+def _bincount(top, num_labels):
+    return np.bincount(top[top >= 0], minlength=num_labels).astype(np.int64)
+
+
+@dataclass
+class SpeechAnalysis:
+    hashes: np.ndarray
+    config: str
+    scores: dict = field(default_factory=dict)
+    labels: dict = field(default_factory=dict)
+    flow: dict = field(default_factory=dict)
+    counts: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def emotion_counts(self, key):
+        """{label: segments whose top emotion it is}, as in the frequency plot."""
+        return {label: int(count) for label, count in zip(self.labels[key], self.counts[key]) if count}
+
+    def emotion_flow(self, key):
+        """Top emotion of every segment in order (None where nothing scored)."""
+        labels = self.labels[key]
+        return [labels[i] if i >= 0 else None for i in self.flow[key]]
+
+    def matrix(self, key):
+        from results import ProbabilityMatrix
+
+        return ProbabilityMatrix(self.scores[key].astype(np.float32), self.labels[key])
+
+    def save(self, path):
+        arrays = {"hashes": self.hashes, "config": np.str_(self.config)}
+        for key in self.scores:
+            arrays[f"scores__{key}"] = self.scores[key]
+            arrays[f"labels__{key}"] = np.array(self.labels[key], dtype=np.str_)
+            arrays[f"flow__{key}"] = self.flow[key]
+            arrays[f"counts__{key}"] = self.counts[key]
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            analysis = cls(data["hashes"], str(data["config"]))
+            for name in data.files:
+                if name.startswith("scores__"):
+                    key = name[len("scores__"):]
+                    analysis.scores[key] = data[name]
+                    analysis.labels[key] = data[f"labels__{key}"].tolist()
+                    analysis.flow[key] = data[f"flow__{key}"]
+                    analysis.counts[key] = data[f"counts__{key}"]
+        return analysis
+
+
+def _config(models, options):
+    """What decides the stored scores: models, scoring options and, for NRC, the lexicon."""
+    config = {"models": list(models), **options}
+    if "nrc" in models:
+        from nrc_lexicon import get_lexicon
+
+        config["nrc"] = get_lexicon().cache_params
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+def reanalyze(
+    speech,
+    transcript_path,
+    mode="line",
+    state_dir=DEFAULT_STATE_DIR,
+    models=MODELS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    **options,
+):
+    """Bring the stored analysis of speech up to date with transcript_path.
+
+    Returns (SpeechAnalysis, report); the report says how many segments were
+    kept, re-scored and removed.
+    """
+    from streaming import iter_segments
+
+    start = time.perf_counter()
+    segments = list(iter_segments(transcript_path, mode))
+    new_hashes = segment_hashes(segments)
+    config = _config(models, options)
+    path = os.path.join(state_dir, f"{speech}.npz")
+    old = SpeechAnalysis.load(path) if os.path.exists(path) else None
+    full = old is None or old.config != config
+    if full:
+        old = SpeechAnalysis(np.empty(0, dtype="S16"), config)
+
+    # Rows of the new segmentation that can be copied from the old one
+    kept_new, kept_old = [], []
+    matcher = difflib.SequenceMatcher(None, old.hashes.tolist(), new_hashes.tolist(), autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            kept_old.append(np.arange(i1, i2))
+            kept_new.append(np.arange(j1, j2))
+    kept_old = np.concatenate(kept_old) if kept_old else np.empty(0, dtype=np.int64)
+    kept_new = np.concatenate(kept_new) if kept_new else np.empty(0, dtype=np.int64)
+    removed = np.setdiff1d(np.arange(len(old)), kept_old, assume_unique=True)
+    changed = np.setdiff1d(np.arange(len(segments)), kept_new, assume_unique=True)
+
+    analysis = SpeechAnalysis(new_hashes, config)
+    # A full run needs each model's labels even when there is nothing to score
+    functions = score_functions(models, batch_size, **options) if full or len(changed) else {}
+    changed_texts = [segments[i] for i in changed]
+    for key in models:
+        if key in functions:
+            labels, score = functions[key]
+            fresh = np.asarray(score(changed_texts))
+        else:
+            labels, fresh = old.labels[key], old.scores[key][:0]
+        scores = np.empty((len(segments), len(labels)), dtype=fresh.dtype)
+        flow = np.empty(len(segments), dtype=np.int16)
+        fresh_flow = top_indices(fresh)
+        if full:
+            counts = np.zeros(len(labels), dtype=np.int64)
+        else:
+            scores[kept_new] = old.scores[key][kept_old]
+            flow[kept_new] = old.flow[key][kept_old]
+            counts = old.counts[key] - _bincount(old.flow[key][removed], len(labels))
+        scores[changed] = fresh
+        flow[changed] = fresh_flow
+        counts += _bincount(fresh_flow, len(labels))
+        analysis.scores[key] = scores
+        analysis.labels[key] = list(labels)
+        analysis.flow[key] = flow
+        analysis.counts[key] = counts
+
+    os.makedirs(state_dir, exist_ok=True)
+    analysis.save(path)
+    report = {
+        "speech": speech,
+        "segments": len(segments),
+        "full_run": full,
+        "kept": len(kept_new),
+        "rescored": len(changed),
+        "removed": len(removed),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return analysis, report
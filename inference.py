@@ -0,0 +1,279 @@
+"""Shared batched inference for the text emotion classifiers.
+
+All three transformer paths in emotionclassification.py (SamLowe go_emotions,
+j-hartmann DistilRoBERTa and cardiffnlp sentiment) go through predict_probs
+instead of running one forward pass per segment. Each batch is padded to its
+own longest member, so short segments are never padded out to 512 tokens.
+
+Segments longer than the model context are either truncated (the original
+behaviour) or, with long_segments="window", split into overlapping token
+windows that are scored alongside the other segments of the batch and
+combined back into one row per segment.
+
+By default inputs are not batched in file order: they are tokenised once,
+sorted into length buckets under a token_budget by scheduler.plan_batches
+and scattered back into their original rows afterwards. This is faster than
+both file-order batches and one segment at a time (README "Batched
+inference"); token_budget=None restores file order.
+
+With dedup ("exact" or "near", see dedup.py), repeated segments are scored
+once and their rows copied to every occurrence.
+
+torch is imported inside the functions that run the model, so importing this
+module (for MODEL_SPECS or the defaults) does not load it.
+"""
+
+import time
+
+import numpy as np
+
+from profiling import stage
+from scheduler import DEFAULT_TOKEN_BUDGET, padding_stats, plan_batches
+
+# Number of segments per forward pass
+DEFAULT_BATCH_SIZE = 32
+
+# Tokens shared by consecutive windows of an over-length segment
+DEFAULT_WINDOW_STRIDE = 128
+
+LONG_SEGMENT_MODES = ("truncate", "window")
+WINDOW_REDUCTIONS = ("mean", "max", "length")
+
+# The three classifiers used in the notebook and how their logits are read
+MODEL_SPECS = {
+    "go_emotions": {
+        "model_name": "SamLowe/roberta-base-go_emotions",
+        "activation": "sigmoid",  # multi-label
+    },
+    "distilroberta": {
+        "model_name": "j-hartmann/emotion-english-distilroberta-base",
+        "activation": "softmax",
+    },
+    "sentiment": {
+        "model_name": "cardiffnlp/twitter-roberta-base-sentiment",
+        "activation": "softmax",
+        "labels": ["negative", "neutral", "positive"],
+    },
+}
+
+
+def iter_batches(items, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield (start, batch) pairs of consecutive items."""
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+    for start in range(0, len(items), batch_size):
+        yield start, items[start:start + batch_size]
+
+
+def activate(logits, activation):
+    """Turn a (batch, labels) logits tensor into probabilities."""
+    if activation == "sigmoid":
+        return logits.sigmoid()
+    if activation == "softmax":
+        return logits.softmax(dim=-1)
+    raise ValueError(f"Unknown activation: {activation!r}")
+
+
+def context_length(tokenizer, default=512):
+    """Longest input the tokenizer will produce, ignoring 'unlimited' sentinels."""
+    limit = tokenizer.model_max_length
+    return limit if limit and limit < 100_000 else default
+
+
+def run_model(model, inputs, activation):
+    """One forward pass over already tokenized inputs, as a float32 array."""
+    import torch
+
+    padding_stats.add(inputs["attention_mask"])
+    with stage("forward", tokens=int(inputs["attention_mask"].sum())), torch.inference_mode():
+        logits = model(**inputs).logits
+    with stage("activation"):
+        return activate(logits.float(), activation).numpy()
+
+
+def reduce_windows(window_probs, owner, num_segments, window_lengths, reduction="mean"):
+    """Combine per-window probabilities into one row per segment.
+
+    owner[i] is the segment that window i came from. "mean" weights windows
+    equally, "length" weights them by token count and "max" keeps the highest
+    probability any window gave each label.
+    """
+    if reduction not in WINDOW_REDUCTIONS:
+        raise ValueError(f"Unknown window reduction: {reduction!r}")
+    num_labels = window_probs.shape[1]
+    if reduction == "max":
+        combined = np.full((num_segments, num_labels), -np.inf, dtype=np.float32)
+        np.maximum.at(combined, owner, window_probs)
+        return combined
+    if reduction == "mean":
+        weights = np.ones(len(owner), dtype=np.float32)
+    else:
+        weights = np.asarray(window_lengths, dtype=np.float32)
+    combined = np.zeros((num_segments, num_labels), dtype=np.float32)
+    np.add.at(combined, owner, window_probs * weights[:, None])
+    combined /= np.bincount(owner, weights=weights, minlength=num_segments)[:, None].astype(np.float32)
+    return combined
+
+
+def tokenize_units(tokenizer, texts, long_segments="truncate", window_stride=DEFAULT_WINDOW_STRIDE):
+    """Unpadded model inputs for texts: (input_ids, attention_mask, owner).
+
+    One unit per text when truncating; with long_segments="window", one unit
+    per window and owner[i] is the text that unit i belongs to.
+    """
+    if long_segments == "window" and not tokenizer.is_fast:
+        raise ValueError("long_segments='window' needs a fast tokenizer")
+    with stage("tokenize") as call:
+        if long_segments == "window":
+            encoded = tokenizer(
+                texts,
+                truncation=True,
+                max_length=context_length(tokenizer),
+                stride=window_stride,
+                return_overflowing_tokens=True,
+            )
+            owner = np.asarray(encoded["overflow_to_sample_mapping"], dtype=np.int64)
+        else:
+            encoded = tokenizer(texts, truncation=True)
+            owner = np.arange(len(texts), dtype=np.int64)
+        call.tokens = sum(len(ids) for ids in encoded["input_ids"])
+    return encoded["input_ids"], encoded["attention_mask"], owner
+
+
+def pad_rows(tokenizer, input_ids, attention_mask, rows):
+    """Tensors for the selected units, padded to the longest of them."""
+    with stage("pad"):
+        return tokenizer.pad(
+            {"input_ids": [input_ids[i] for i in rows], "attention_mask": [attention_mask[i] for i in rows]},
+            padding="longest",
+            return_tensors="pt",
+        )
+
+
+def _predict_windows(model, tokenizer, batch, activation, batch_size, window_stride, window_reduction):
+    window_ids, window_mask, owner = tokenize_units(tokenizer, batch, "window", window_stride)
+    window_probs = np.empty((len(window_ids), model.config.num_labels), dtype=np.float32)
+    # Windows from every segment in the batch share forward passes
+    for start in range(0, len(window_ids), batch_size):
+        rows = range(start, min(start + batch_size, len(window_ids)))
+        window_probs[start:rows.stop] = run_model(model, pad_rows(tokenizer, window_ids, window_mask, rows), activation)
+    window_lengths = [len(ids) for ids in window_ids]
+    return reduce_windows(window_probs, owner, len(batch), window_lengths, window_reduction)
+
+
+def _predict_scheduled(model, tokenizer, texts, activation, batch_size, token_budget, long_segments, window_stride, window_reduction):
+    input_ids, attention_mask, owner = tokenize_units(tokenizer, texts, long_segments, window_stride)
+    lengths = [len(ids) for ids in input_ids]
+    unit_probs = np.empty((len(input_ids), model.config.num_labels), dtype=np.float32)
+    for rows in plan_batches(lengths, token_budget, batch_size):
+        unit_probs[rows] = run_model(model, pad_rows(tokenizer, input_ids, attention_mask, rows), activation)
+    if long_segments == "window":
+        return reduce_windows(unit_probs, owner, len(texts), lengths, window_reduction)
+    return unit_probs
+
+
+def predict_probs(
+    model,
+    tokenizer,
+    texts,
+    activation="softmax",
+    batch_size=DEFAULT_BATCH_SIZE,
+    long_segments="truncate",
+    window_stride=DEFAULT_WINDOW_STRIDE,
+    window_reduction="mean",
+    token_budget=DEFAULT_TOKEN_BUDGET,
+    dedup=None,
+    near_threshold=None,
+):
+    """Score texts in dynamically padded batches.
+
+    Returns a float32 array of shape (len(texts), num_labels) whose rows are in
+    the same order as texts. long_segments="window" scores segments longer
+    than the model context as overlapping windows, combined with
+    window_reduction ("mean", "max" or "length"). Batches are length-bucketed
+    and hold up to token_budget padded tokens and at most batch_size texts;
+    token_budget=None takes batch_size texts in file order. With dedup, each
+    distinct segment is scored once.
+    """
+    if long_segments not in LONG_SEGMENT_MODES:
+        raise ValueError(f"Unknown long_segments mode: {long_segments!r}")
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, model.config.num_labels), dtype=np.float32)
+    if dedup is not None:
+        from dedup import DEFAULT_NEAR_THRESHOLD, find_duplicates
+
+        duplicates = find_duplicates(texts, dedup, near_threshold or DEFAULT_NEAR_THRESHOLD)
+        if duplicates.unique < len(texts):
+            unique_probs = predict_probs(
+                model, tokenizer, [texts[i] for i in duplicates.representatives], activation, batch_size,
+                long_segments, window_stride, window_reduction, token_budget,
+            )
+            return duplicates.expand(unique_probs)
+    if token_budget is not None:
+        return _predict_scheduled(
+            model, tokenizer, texts, activation, batch_size, token_budget, long_segments, window_stride, window_reduction
+        )
+    probs = np.empty((len(texts), model.config.num_labels), dtype=np.float32)
+    for start, batch in iter_batches(texts, batch_size):
+        if long_segments == "window":
+            batch_probs = _predict_windows(
+                model, tokenizer, batch, activation, batch_size, window_stride, window_reduction
+            )
+        else:
+            with stage("tokenize") as call:
+                inputs = tokenizer(batch, return_tensors="pt", truncation=True, padding="longest")
+                call.tokens = int(inputs["attention_mask"].sum())
+            batch_probs = run_model(model, inputs, activation)
+        probs[start:start + len(batch)] = batch_probs
+    return probs
+
+
+def segments_per_second(model, tokenizer, texts, activation="softmax", batch_size=DEFAULT_BATCH_SIZE, repeats=3, **options):
+    """Best-of-N throughput of predict_probs over texts."""
+    texts = list(texts)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_probs(model, tokenizer, texts, activation=activation, batch_size=batch_size, **options)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def compare_long_segment_modes(
+    model,
+    tokenizer,
+    texts,
+    activation="softmax",
+    batch_size=DEFAULT_BATCH_SIZE,
+    window_stride=DEFAULT_WINDOW_STRIDE,
+    window_reduction="mean",
+):
+    """Cost and label drift of window scoring relative to plain truncation."""
+    texts = list(texts)
+    limit = context_length(tokenizer)
+    token_counts = np.array([len(ids) for ids in tokenizer(texts, verbose=False)["input_ids"]])
+    over = token_counts > limit
+
+    start = time.perf_counter()
+    truncated = predict_probs(model, tokenizer, texts, activation, batch_size)
+    truncate_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    windowed = predict_probs(
+        model, tokenizer, texts, activation, batch_size,
+        long_segments="window", window_stride=window_stride, window_reduction=window_reduction,
+    )
+    window_seconds = time.perf_counter() - start
+
+    diff = np.abs(windowed - truncated)
+    return {
+        "segments": len(texts),
+        "over_length_segments": int(over.sum()),
+        "dropped_token_fraction": float(np.clip(token_counts - limit, 0, None).sum() / max(token_counts.sum(), 1)),
+        "truncate_seconds": round(truncate_seconds, 3),
+        "window_seconds": round(window_seconds, 3),
+        "cost_ratio": round(window_seconds / truncate_seconds, 2) if truncate_seconds else None,
+        "top_label_agreement": float((windowed.argmax(1) == truncated.argmax(1)).mean()) if len(texts) else 1.0,
+        "mean_abs_prob_diff_over_length": float(diff[over].mean()) if over.any() else 0.0,
+        "max_abs_prob_diff": float(diff.max()) if len(texts) else 0.0,
+    }
@@ -0,0 +1,140 @@
+"""Process-wide registry of loaded classifier checkpoints.
+
+Every section of emotionclassification.py asks the registry for its tokenizer
+and model instead of calling from_pretrained itself, so each checkpoint is
+loaded once per process no matter how many speeches are analysed. Models are
+handed out in eval mode with gradients switched off and are shared between
+callers; treat them as read-only. A backend other than fp32 eager ("int8",
+"onnx"; see backends.py) is part of the key, so each variant is also built
+only once.
+"""
+
+import gc
+import os
+import resource
+import threading
+import time
+from dataclasses import dataclass
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or peak RSS where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+@dataclass
+class LoadedModel:
+    model_name: str
+    revision: str
+    backend: str
+    tokenizer: object
+    model: object
+    load_seconds: float
+    param_bytes: int
+    rss_delta_bytes: int
+
+    def stats(self):
+        return {
+            "model_name": self.model_name,
+            "revision": self.revision,
+            "backend": self.backend,
+            "load_seconds": round(self.load_seconds, 3),
+            "param_mb": round(self.param_bytes / 2**20, 1),
+            "rss_delta_mb": round(self.rss_delta_bytes / 2**20, 1),
+        }
+
+
+class ModelRegistry:
+    """Loads each (model_name, revision, backend) once and hands out the shared instance."""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_name, revision, backend="eager"):
+        return model_name, revision or "main", backend
+
+    def __contains__(self, model_name):
+        return any(name == model_name for name, _, _ in self._models)
+
+    def get(self, model_name, revision=None, backend="eager"):
+        """Return the LoadedModel for model_name, loading it on first use."""
+        key = self._key(model_name, revision, backend)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self._load(*key)
+            return self._models[key]
+
+    def load(self, model_name, revision=None, backend="eager"):
+        """Return (tokenizer, model) for model_name."""
+        entry = self.get(model_name, revision, backend)
+        return entry.tokenizer, entry.model
+
+    def _load(self, model_name, revision, backend):
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        from backends import model_nbytes, prepare
+
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+        try:
+            # safetensors weights are memory-mapped and never unpickled
+            model = AutoModelForSequenceClassification.from_pretrained(model_name, revision=revision, use_safetensors=True)
+        except OSError:
+            # Checkpoint only has pytorch_model.bin
+            model = AutoModelForSequenceClassification.from_pretrained(model_name, revision=revision)
+        model.eval()
+        model.requires_grad_(False)
+        model = prepare(model, tokenizer, model_name, revision, backend)
+        load_seconds = time.perf_counter() - start
+        param_bytes = model_nbytes(model)
+        return LoadedModel(
+            model_name=model_name,
+            revision=revision,
+            backend=backend,
+            tokenizer=tokenizer,
+            model=model,
+            load_seconds=load_seconds,
+            param_bytes=param_bytes,
+            rss_delta_bytes=max(current_rss_bytes() - rss_before, 0),
+        )
+
+    def evict(self, model_name, revision=None, backend="eager"):
+        """Drop a model from the registry. Returns False if it was not loaded.
+
+        Memory is only returned once no caller holds a reference to the model.
+        """
+        with self._lock:
+            entry = self._models.pop(self._key(model_name, revision, backend), None)
+        if entry is None:
+            return False
+        del entry
+        gc.collect()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+        gc.collect()
+
+    def stats(self):
+        """Load time and memory for every loaded model."""
+        with self._lock:
+            return [entry.stats() for entry in self._models.values()]
+
+
+# Shared by everything in this process
+registry = ModelRegistry()
+
+
+def load_model(model_name, revision=None, backend="eager"):
+    """Return the shared (tokenizer, model) pair for model_name."""
+    return registry.load(model_name, revision, backend)
@@ -0,0 +1,201 @@
+"""Vectorised NRC emotion lexicon scoring.
+
+Replaces building one NRCLex object per segment. The NRC word -> emotion table
+is loaded once into a sparse (words x emotions) matrix; a batch of segments is
+tokenised into a sparse (segments x words) count matrix and the raw emotion
+counts for the whole batch come out of a single sparse matrix product.
+
+Tokenisation follows what NRCLex gets from TextBlob: case is kept, hyphenated
+words stay whole, "n't" is split off, and each word is lemmatised as a noun
+when NLTK's WordNet data is installed locally. Nothing is ever downloaded. Each
+distinct token is looked up and lemmatised once and then cached, so the
+per-token cost is a single dict lookup.
+"""
+
+import hashlib
+import json
+import re
+import warnings
+from functools import lru_cache
+from importlib import resources
+
+import numpy as np
+from scipy import sparse
+
+from profiling import stage
+
+# NRCLex's emotion order, which also decides the order of top_emotions ties
+EMOTIONS = [
+    "fear", "anger", "anticipation", "trust", "surprise",
+    "positive", "negative", "sadness", "disgust", "joy",
+]
+
+# Runs of letters, kept whole across hyphens and typographic apostrophes
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:[-’][^\W\d_]+)*")
+
+
+def tokenize(text):
+    """Lexicon-relevant tokens of text ("don't" -> "do", "n", "t" like TextBlob's "do", "n't")."""
+    return TOKEN_PATTERN.findall(text.replace("n't", " n't").replace("N'T", " N'T"))
+
+
+def bundled_lexicon_path():
+    """Path of the nrc_en.json shipped with the nrclex package."""
+    for package, name in (("nrclex.data", "nrc_en.json"), ("nrclex", "nrc_en.json")):
+        try:
+            path = resources.files(package).joinpath(name)
+        except ModuleNotFoundError:
+            continue
+        if path.is_file():
+            return path
+    raise FileNotFoundError("nrc_en.json not found; install nrclex or pass lexicon_path")
+
+
+def wordnet_lemmatizer():
+    """TextBlob's noun lemmatiser if WordNet is installed locally, else None."""
+    try:
+        from nltk.stem import WordNetLemmatizer
+
+        lemmatizer = WordNetLemmatizer()
+        lemmatizer.lemmatize("tests")
+    except (ImportError, LookupError):
+        return None
+    return lemmatizer.lemmatize
+
+
+class NRCLexicon:
+    def __init__(self, lexicon_path=None, lemmatize="auto"):
+        with open(lexicon_path or bundled_lexicon_path(), "rb") as f:
+            data = f.read()
+        table = json.loads(data.decode("utf-8"))
+        # Identifies the word list in cache keys, whatever file it came from
+        self.version = hashlib.sha256(data).hexdigest()[:16]
+        self.words = list(table)
+        self.word_index = {word: i for i, word in enumerate(self.words)}
+        emotion_index = {emotion: j for j, emotion in enumerate(EMOTIONS)}
+        rows, cols = [], []
+        for i, word in enumerate(self.words):
+            for emotion in table[word]:
+                rows.append(i)
+                cols.append(emotion_index[emotion])
+        self.word_emotions = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(self.words), len(EMOTIONS)),
+        )
+        if lemmatize == "auto":
+            lemmatize = wordnet_lemmatizer()
+            if lemmatize is None:
+                warnings.warn("WordNet data not found; NRC tokens are matched without lemmatisation")
+        self.lemmatize = lemmatize or None
+        # token -> lexicon row, or -1 for tokens that are not in the lexicon
+        self._token_rows = {}
+
+    @property
+    def cache_params(self):
+        """What decides this lexicon's scores besides the text: word list and lemmatiser."""
+        lemmatizer = getattr(self.lemmatize, "__qualname__", type(self.lemmatize).__name__) if self.lemmatize else None
+        return {"lexicon": self.version, "lemmatizer": lemmatizer}
+
+    def _new_token_row(self, token):
+        word = self.lemmatize(token) if self.lemmatize else token
+        row = self._token_rows[token] = self.word_index.get(word, -1)
+        return row
+
+    def count_matrix(self, texts):
+        """Sparse (texts x lexicon words) matrix of lexicon word counts."""
+        token_rows = self._token_rows
+        indptr = [0]
+        indices = []
+        for text in texts:
+            for token in tokenize(text):
+                row = token_rows.get(token)
+                if row is None:
+                    row = self._new_token_row(token)
+                if row >= 0:
+                    indices.append(row)
+            indptr.append(len(indices))
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.words)),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def raw_scores(self, texts):
+        """Dense (texts x EMOTIONS) int array of raw emotion counts."""
+        with stage("nrc_score") as call:
+            counts = self.count_matrix(texts)
+            call.tokens = int(counts.sum())
+            return np.asarray((counts @ self.word_emotions).todense())
+
+    def frequencies(self, raw):
+        """NRCLex affect_frequencies: counts over each segment's total."""
+        totals = raw.sum(axis=1, keepdims=True)
+        return np.divide(raw, totals, out=np.zeros(raw.shape, dtype=np.float64), where=totals > 0)
+
+    def top_mask(self, frequencies):
+        """Emotions tied for the highest frequency (all of them when nothing matched)."""
+        return frequencies == frequencies.max(axis=1, keepdims=True)
+
+    def score(self, texts):
+        """NRCLex-equivalent raw_emotion_scores and top_emotions for every text."""
+        raw = self.raw_scores(list(texts))
+        frequencies = self.frequencies(raw)
+        top = self.top_mask(frequencies)
+        results = []
+        for counts, freqs, is_top in zip(raw.tolist(), frequencies.tolist(), top.tolist()):
+            results.append({
+                "raw_scores": {e: c for e, c in zip(EMOTIONS, counts) if c},
+                "top_emotions": [(e, f) for e, f, t in zip(EMOTIONS, freqs, is_top) if t],
+            })
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_lexicon(lexicon_path=None):
+    """Process-wide NRCLexicon, built on first use."""
+    return NRCLexicon(lexicon_path)
+
+
+def compare_with_nrclex(texts, lexicon=None):
+    """Fraction of texts where this scorer matches NRCLex, and the speed-up.
+
+    NRCLex runs as the notebook used to run it: a new object per segment,
+    with TextBlob tokenising and lemmatising the raw text. The speed-up is
+    therefore end to end. Needs nrclex 4 and the NLTK data TextBlob uses
+    (punkt_tab, wordnet); only used for checking.
+    """
+    import time
+
+    from nrclex import NRCLex
+
+    texts = list(texts)
+    lexicon = lexicon or get_lexicon()
+    start = time.perf_counter()
+    ours = lexicon.score(texts)
+    ours_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    theirs = []
+    for text in texts:
+        # NRCLex 4 takes a lexicon path; the text goes through load_raw_text
+        emotion_obj = NRCLex()
+        emotion_obj.load_raw_text(text)
+        theirs.append((emotion_obj.raw_emotion_scores, emotion_obj.top_emotions))
+    theirs_seconds = time.perf_counter() - start
+
+    raw_matches = sum(mine["raw_scores"] == dict(raw) for mine, (raw, _) in zip(ours, theirs))
+    top_matches = sum(
+        {e for e, _ in mine["top_emotions"]} == {e for e, _ in top if e in EMOTIONS}
+        for mine, (_, top) in zip(ours, theirs)
+    )
+    return {
+        "segments": len(texts),
+        # None when WordNet is missing; NRCLex always lemmatises, so parity then drops
+        "lemmatizer": lexicon.cache_params["lemmatizer"],
+        "seconds": round(ours_seconds, 3),
+        "nrclex_seconds": round(theirs_seconds, 3),
+        "raw_scores_match": raw_matches / len(texts) if texts else 1.0,
+        "top_emotions_match": top_matches / len(texts) if texts else 1.0,
+        "speedup": round(theirs_seconds / ours_seconds, 1) if ours_seconds else None,
+    }
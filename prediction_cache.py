@@ -0,0 +1,189 @@
+"""On-disk cache of per-segment model outputs.
+
+Entries are keyed by a SHA-256 of the segment text together with the model
+name, revision and any scoring parameters (such as the go_emotions threshold),
+so changing any of them misses the cache instead of returning stale scores.
+NRC lexicon results are keyed on a digest of the word list and on the
+lemmatiser in use (NRCLexicon.cache_params), since both change the counts.
+Probability rows are stored as raw float32 bytes; lexicon results as JSON.
+The cache is a single SQLite file in WAL mode and is trimmed back to
+max_bytes on write, least recently used entries first. Processes can share
+it: the total size and the LRU clock are read from the table inside each
+write transaction, and a writer waits up to timeout seconds for another's lock.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = "emotion_cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 2**20
+# Seconds a connection waits for another process's write lock before failing
+DEFAULT_BUSY_TIMEOUT = 60.0
+
+
+def cache_key(text, model_name, revision=None, **params):
+    """Content address for one segment scored by one model configuration."""
+    config = json.dumps(
+        {"model": model_name, "revision": revision or "main", "params": params},
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(config.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_BUSY_TIMEOUT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Several processes may share the file (corpus_runner workers): WAL lets
+        # readers run alongside the one writer, and writers wait up to timeout
+        # Autocommit mode; writes open their own transactions in _write
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS predictions_lru ON predictions (last_used)")
+
+    @contextmanager
+    def _write(self):
+        """A write transaction that holds the database lock from its start.
+
+        The size budget and LRU clock live in the table, not in this object,
+        so that every process sharing the file sees the same ones; BEGIN
+        IMMEDIATE keeps them from changing between reading and writing.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _tick(self):
+        (clock,) = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM predictions").fetchone()
+        return clock + 1
+
+    def _total_bytes(self):
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM predictions").fetchone()
+        return total
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys that are cached."""
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM predictions WHERE key IN ({marks})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                with self._write():
+                    now = self._tick()
+                    self._conn.executemany(
+                        "UPDATE predictions SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items):
+        """Store (key, value) pairs and evict down to max_bytes."""
+        with self._lock, self._write():
+            now = self._tick()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO predictions (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                [(key, value, len(key) + len(value), now) for key, value in items],
+            )
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the file's total is within max_bytes."""
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM predictions ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                total -= size
+                self.evictions += 1
+
+    def probs(self, texts, model_name, score_fn, revision=None, **params):
+        """Probability matrix for texts, calling score_fn only on uncached ones.
+
+        score_fn takes a list of texts and returns a (len(texts), num_labels)
+        array. It is not called at all when every text is cached, except for
+        empty input, where score_fn([]) gives the (0, num_labels) result.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.asarray(score_fn([]), dtype=np.float32)
+        keys = [cache_key(text, model_name, revision, **params) for text in texts]
+        found = self.get_many(keys)
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            text_for_key = dict(zip(keys, texts))
+            scored = np.asarray(score_fn([text_for_key[key] for key in missing]), dtype=np.float32)
+            new = {key: row.tobytes() for key, row in zip(missing, scored)}
+            self.put_many(new.items())
+            found.update(new)
+        return np.stack([np.frombuffer(found[key], dtype=np.float32) for key in keys])
+
+    def records(self, texts, model_name, score_fn, revision=None, **params):
+        """Like probs, for JSON-serialisable per-text results (e.g. NRC scores)."""
+        texts = list(texts)
+        keys = [cache_key(text, model_name, revision, **params) for text in texts]
+        found = self.get_many(keys)
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            text_for_key = dict(zip(keys, texts))
+            scored = score_fn([text_for_key[key] for key in missing])
+            new = {key: json.dumps(record).encode("utf-8") for key, record in zip(missing, scored)}
+            self.put_many(new.items())
+            found.update(new)
+        return [json.loads(found[key]) for key in keys]
+
+    def stats(self):
+        with self._lock:
+            total = self._total_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_mb": round(total / 2**20, 2),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
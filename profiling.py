@@ -0,0 +1,197 @@
+"""Per-stage timing for the scoring pipeline.
+
+Code marks its stages with
+
+    with stage("tokenize") as call:
+        ...
+        call.tokens = n
+
+stage_timer then holds, for every stage, its wall time, number of calls,
+tokens processed and the process's peak RSS (high-water mark) when the
+stage last finished. Stages nest: a "forward" inside
+"get_sentiment_scores" is recorded as "get_sentiment_scores/forward", so
+each model's stages can be told apart. Timing costs a few microseconds per
+call, so it is always on.
+
+torch_profile() additionally records a torch.profiler trace. Each stage
+shows up in it as a labelled range; the trace is written as a Chrome trace
+JSON when the block exits.
+
+Results are exported with to_json() / write_json(path) and with
+to_prometheus() / write_prometheus(path). The latter writes the text format
+read by node_exporter's textfile collector.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+
+from model_registry import current_rss_bytes
+
+METRIC_PREFIX = "emotion_stage"
+
+
+def peak_rss_bytes():
+    """Highest resident set size this process has reached."""
+    try:
+        # VmHWM belongs to this address space; ru_maxrss on Linux survives
+        # exec and so includes the parent's peak in spawned workers
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    tokens: int = 0
+    peak_rss_bytes: int = 0
+    max_rss_growth_bytes: int = 0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "seconds": round(self.seconds, 6),
+            "mean_ms": round(1000 * self.seconds / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(1000 * self.max_seconds, 3),
+            "tokens": self.tokens,
+            "tokens_per_sec": round(self.tokens / self.seconds, 1) if self.seconds and self.tokens else 0.0,
+            "peak_rss_mb": round(self.peak_rss_bytes / 2**20, 1),
+            "max_rss_growth_mb": round(self.max_rss_growth_bytes / 2**20, 1),
+        }
+
+
+class _Call:
+    """Handed to the body of a stage so it can report the tokens it handled."""
+
+    __slots__ = ("tokens",)
+
+    def __init__(self):
+        self.tokens = 0
+
+
+class StageTimer:
+    """Wall time, calls, tokens and peak RSS for every named stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._torch_profiling = False
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def stage(self, name, tokens=0):
+        stack = self._stack()
+        stack.append(name)
+        path = "/".join(stack)
+        call = _Call()
+        call.tokens = tokens
+        label = self._record_function(path) if self._torch_profiling else nullcontext()
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        try:
+            with label:
+                yield call
+        finally:
+            seconds = time.perf_counter() - start
+            growth = current_rss_bytes() - rss_before
+            peak = peak_rss_bytes()
+            stack.pop()
+            with self._lock:
+                stats = self.stages.setdefault(path, StageStats())
+                stats.calls += 1
+                stats.seconds += seconds
+                stats.max_seconds = max(stats.max_seconds, seconds)
+                stats.tokens += call.tokens
+                stats.peak_rss_bytes = max(stats.peak_rss_bytes, peak)
+                stats.max_rss_growth_bytes = max(stats.max_rss_growth_bytes, growth)
+
+    @staticmethod
+    def _record_function(path):
+        from torch.profiler import record_function
+
+        return record_function(path)
+
+    @contextmanager
+    def torch_profile(self, trace_path="torch_trace.json", record_shapes=False, profile_memory=False):
+        """Capture a torch.profiler trace of the block, with every stage labelled."""
+        from torch.profiler import ProfilerActivity, profile
+
+        with profile(
+            activities=[ProfilerActivity.CPU], record_shapes=record_shapes, profile_memory=profile_memory
+        ) as profiler:
+            self._torch_profiling = True
+            try:
+                yield profiler
+            finally:
+                self._torch_profiling = False
+        profiler.export_chrome_trace(trace_path)
+
+    def report(self):
+        with self._lock:
+            return {path: stats.as_dict() for path, stats in sorted(self.stages.items())}
+
+    def to_json(self):
+        return json.dumps({"stages": self.report(), "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1)}, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format, one series per stage."""
+        with self._lock:
+            stages = sorted(self.stages.items())
+        metrics = [
+            ("seconds_total", "counter", "Wall time spent in the stage.", lambda s: round(s.seconds, 6)),
+            ("calls_total", "counter", "Times the stage ran.", lambda s: s.calls),
+            ("tokens_total", "counter", "Tokens processed by the stage.", lambda s: s.tokens),
+            ("peak_rss_bytes", "gauge", "Process peak RSS when the stage last finished.", lambda s: s.peak_rss_bytes),
+        ]
+        lines = []
+        for suffix, kind, help_text, value in metrics:
+            name = f"{METRIC_PREFIX}_{suffix}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for path, stats in stages:
+                escaped = path.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{name}{{stage="{escaped}"}} {value(stats)}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write(path, text):
+        # Write then rename, so a scraper never reads a half-written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def write_json(self, path):
+        self._write(path, self.to_json())
+
+    def write_prometheus(self, path):
+        self._write(path, self.to_prometheus())
+
+
+# Every instrumented stage in this process reports here
+stage_timer = StageTimer()
+stage = stage_timer.stage
+torch_profile = stage_timer.torch_profile
@@ -0,0 +1,139 @@
+"""Columnar storage for per-segment classifier probabilities.
+
+A ProbabilityMatrix keeps one float32 row per segment instead of a dict of
+Python floats per segment, so a go_emotions result costs 28 * 4 bytes per
+segment. Thresholding, top-k and argmax run over the whole matrix at once, and
+to_arrow wraps the matrix buffer without copying it.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from profiling import stage
+
+
+@dataclass
+class ProbabilityMatrix:
+    probs: np.ndarray
+    labels: list
+    segment_ids: np.ndarray = None
+
+    def __post_init__(self):
+        self.probs = np.ascontiguousarray(self.probs, dtype=np.float32)
+        if self.probs.ndim != 2:
+            raise ValueError(f"probs must be 2-D, got shape {self.probs.shape}")
+        self.labels = list(self.labels)
+        if self.probs.shape[1] != len(self.labels):
+            raise ValueError(f"{self.probs.shape[1]} probability columns but {len(self.labels)} labels")
+        if self.segment_ids is None:
+            self.segment_ids = np.arange(len(self.probs), dtype=np.int64)
+        self.segment_ids = np.asarray(self.segment_ids, dtype=np.int64)
+        if self.segment_ids.shape != (len(self.probs),):
+            raise ValueError("segment_ids must have one entry per row")
+
+    def __len__(self):
+        return len(self.probs)
+
+    @property
+    def nbytes(self):
+        return self.probs.nbytes + self.segment_ids.nbytes
+
+    def column(self, label):
+        return self.probs[:, self.labels.index(label)]
+
+    def argmax(self):
+        return self.probs.argmax(axis=1)
+
+    def top_labels(self):
+        """Most probable label of every segment."""
+        return np.asarray(self.labels, dtype=object)[self.argmax()]
+
+    def above(self, threshold):
+        """Boolean (segments x labels) mask of probabilities over threshold."""
+        return self.probs > threshold
+
+    def labels_above(self, threshold):
+        """Per-segment lists of labels over threshold (multi-label prediction)."""
+        names = np.asarray(self.labels, dtype=object)
+        return [names[row].tolist() for row in self.above(threshold)]
+
+    def label_counts(self, threshold=None):
+        """How often each label is predicted: top label, or every label over threshold."""
+        if threshold is None:
+            counts = np.bincount(self.argmax(), minlength=len(self.labels))
+        else:
+            counts = self.above(threshold).sum(axis=0)
+        return dict(zip(self.labels, counts.tolist()))
+
+    def top_k(self, k):
+        """(indices, probabilities) of the k most probable labels per segment, best first."""
+        k = min(k, len(self.labels))
+        part = np.argpartition(-self.probs, k - 1, axis=1)[:, :k]
+        part_probs = np.take_along_axis(self.probs, part, axis=1)
+        order = np.argsort(-part_probs, axis=1)
+        return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_probs, order, axis=1)
+
+    def take(self, rows):
+        return ProbabilityMatrix(self.probs[rows], self.labels, self.segment_ids[rows])
+
+    def row_dict(self, row, decimals=None):
+        values = self.probs[row] if decimals is None else np.round(self.probs[row], decimals)
+        return dict(zip(self.labels, values.tolist()))
+
+    def to_frame(self, decimals=None):
+        """pandas DataFrame with one column per label, indexed by segment ID."""
+        import pandas as pd
+
+        with stage("dataframe"):
+            probs = self.probs if decimals is None else np.round(self.probs, decimals)
+            return pd.DataFrame(probs, columns=self.labels, index=pd.Index(self.segment_ids, name="segment_id"))
+
+    def to_arrow(self):
+        """Arrow table (segment_id, probs) sharing memory with this matrix.
+
+        probs is a fixed-size list column; labels are kept in the schema metadata.
+        """
+        import pyarrow as pa
+
+        flat = pa.array(self.probs.reshape(-1))
+        probs = pa.FixedSizeListArray.from_arrays(flat, len(self.labels))
+        table = pa.table({"segment_id": pa.array(self.segment_ids), "probs": probs})
+        return table.replace_schema_metadata({"labels": "\x1f".join(self.labels)})
+
+    @classmethod
+    def from_arrow(cls, table):
+        labels = table.schema.metadata[b"labels"].decode("utf-8").split("\x1f")
+        probs = table.column("probs").combine_chunks().flatten().to_numpy()
+        segment_ids = table.column("segment_id").to_numpy()
+        return cls(probs.reshape(-1, len(labels)), labels, segment_ids)
+
+    def to_parquet(self, path):
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path)
+
+    @classmethod
+    def read_parquet(cls, path):
+        import pyarrow.parquet as pq
+
+        return cls.from_arrow(pq.read_table(path))
+
+
+def concat_columns(*frames):
+    """Put frames indexed by the same segment IDs side by side, without a join.
+
+    Columns that an earlier frame already has (such as "text") are taken from
+    the first frame only.
+    """
+    import pandas as pd
+
+    with stage("combine"):
+        first = frames[0]
+        parts, seen = [first], set(first.columns)
+        for frame in frames[1:]:
+            if not frame.index.equals(first.index):
+                raise ValueError("Frames are not aligned on segment_id")
+            parts.append(frame.drop(columns=[column for column in frame.columns if column in seen]))
+            seen.update(frame.columns)
+        return pd.concat(parts, axis=1)
@@ -0,0 +1,369 @@
+"""Local HTTP service that scores segments with micro-batching.
+
+Requests from many clients are merged into shared forward passes. Each model
+has its own MicroBatcher: segments queue up, and the queue is flushed as one
+predict_probs call once max_batch_size segments are waiting or the oldest
+has waited max_wait_ms, whichever is first. Only one batch runs at a time,
+on a single inference thread, so torch keeps every core for that batch and
+the event loop stays free to accept requests.
+
+Backpressure: once max_pending segments are queued for a model, new requests
+are refused with 503 instead of queuing without bound. A request with more
+than max_pending texts could never be queued, so it gets 413 with the limit
+instead of a 503 that would be retried forever. Deadlines: a request
+can carry deadline_ms. When that passes it gets 504, and if it is still
+queued its segments are dropped before the forward pass. A missing or empty
+texts list, or a deadline_ms that is not a positive number, gets 400; an
+error raised while scoring gets 500 with its message.
+
+    python service.py --models distilroberta sentiment --port 8000
+
+    POST /score/<model>   {"texts": [...], "deadline_ms": 250}
+    GET  /metrics         p50/p99 latency, throughput, batch sizes
+    GET  /health
+
+Weights come from the local Hugging Face cache: HF_HUB_OFFLINE is set
+unless the caller has already set it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_PENDING = 4096
+# Latencies kept for the percentiles
+LATENCY_WINDOW = 10_000
+
+
+class Overloaded(Exception):
+    """The model's queue is full."""
+
+
+class TooLarge(Exception):
+    """The request has more texts than the queue can ever hold."""
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before it was scored."""
+
+
+@dataclass
+class _Request:
+    texts: list
+    future: asyncio.Future
+    enqueued: float
+    deadline: float = None
+
+
+@dataclass
+class BatchMetrics:
+    """Latency and throughput for one MicroBatcher."""
+
+    started: float = field(default_factory=time.perf_counter)
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    requests: int = 0
+    segments: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+    rejected: int = 0
+    expired: int = 0
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = np.fromiter(self.latencies, dtype=np.float64)
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (0.0, 0.0)
+        return {
+            "requests": self.requests,
+            "segments": self.segments,
+            "batches": self.batches,
+            "mean_batch_size": round(self.segments / self.batches, 2) if self.batches else 0.0,
+            "p50_ms": round(float(p50), 2),
+            "p99_ms": round(float(p99), 2),
+            "segments_per_sec": round(self.segments / elapsed, 1) if elapsed else 0.0,
+            "busy_fraction": round(self.busy_seconds / elapsed, 3) if elapsed else 0.0,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+
+class MicroBatcher:
+    """Queues segments for score_fn and flushes them in batches.
+
+    score_fn takes a list of texts and returns one result per text; it runs
+    on executor, so it may block.
+    """
+
+    def __init__(
+        self,
+        score_fn,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms=DEFAULT_MAX_WAIT_MS,
+        max_pending=DEFAULT_MAX_PENDING,
+        executor=None,
+    ):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_pending = max_pending
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.metrics = BatchMetrics()
+        self._queue = deque()
+        self._pending = 0
+        self._arrived = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, texts, deadline_ms=None):
+        """Score texts as part of a batch. Raises TooLarge, Overloaded or DeadlineExceeded."""
+        texts = list(texts)
+        if len(texts) > self.max_pending:
+            self.metrics.rejected += 1
+            raise TooLarge(f"{len(texts)} texts in one request; the limit is {self.max_pending}")
+        if self._pending + len(texts) > self.max_pending:
+            self.metrics.rejected += 1
+            raise Overloaded
+        now = time.perf_counter()
+        request = _Request(
+            texts,
+            asyncio.get_running_loop().create_future(),
+            now,
+            now + deadline_ms / 1000 if deadline_ms is not None else None,
+        )
+        self._queue.append(request)
+        self._pending += len(texts)
+        self._arrived.set()
+        try:
+            # shield: a timed-out request must not cancel the future the batch loop still holds
+            return await asyncio.wait_for(asyncio.shield(request.future), deadline_ms / 1000 if deadline_ms is not None else None)
+        except asyncio.TimeoutError:
+            self.metrics.expired += 1
+            raise DeadlineExceeded from None
+
+    async def _collect(self):
+        """Wait for the next batch: full, or the oldest request has waited max_wait."""
+        while not self._queue:
+            self._arrived.clear()
+            await self._arrived.wait()
+        flush_at = self._queue[0].enqueued + self.max_wait
+        while self._pending < self.max_batch_size:
+            remaining = flush_at - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        batch, size = [], 0
+        # A request is never split; one larger than max_batch_size goes alone
+        while self._queue and (not batch or size + len(self._queue[0].texts) <= self.max_batch_size):
+            request = self._queue.popleft()
+            self._pending -= len(request.texts)
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            now = time.perf_counter()
+            live = [r for r in batch if not r.future.done() and (r.deadline is None or r.deadline > now)]
+            if not live:
+                continue
+            texts = [text for request in live for text in request.texts]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.score_fn, texts)
+            except Exception as exc:
+                for request in live:
+                    if not request.future.done():
+                        request.future.set_exception(exc)
+                continue
+            finished = time.perf_counter()
+            self.metrics.batches += 1
+            self.metrics.busy_seconds += finished - start
+            offset = 0
+            for request in live:
+                count = len(request.texts)
+                if not request.future.done():
+                    request.future.set_result(results[offset:offset + count])
+                offset += count
+                self.metrics.requests += 1
+                self.metrics.segments += count
+                self.metrics.latencies.append(finished - request.enqueued)
+
+
+def model_score_fn(key, backend="eager", token_budget=None, **options):
+    """texts -> [{"top": label, "scores": {label: prob}}] for one of MODEL_SPECS."""
+    from inference import MODEL_SPECS, predict_probs
+    from model_registry import load_model
+    from scheduler import DEFAULT_TOKEN_BUDGET
+    from streaming import model_labels
+
+    spec = MODEL_SPECS[key]
+    tokenizer, model = load_model(spec["model_name"], backend=backend)
+    labels = model_labels(model, spec)
+    token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+
+    def score(texts):
+        probs = predict_probs(
+            model, tokenizer, texts, spec["activation"], batch_size=len(texts), token_budget=token_budget, **options
+        )
+        return [
+            {"top": labels[int(row.argmax())], "scores": {label: round(float(p), 4) for label, p in zip(labels, row)}}
+            for row in probs
+        ]
+
+    return score
+
+
+class EmotionService:
+    """Minimal HTTP/1.1 front end over one MicroBatcher per model."""
+
+    def __init__(self, batchers):
+        self.batchers = batchers
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self.route(method, urlsplit(target).path, body)
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return "200 OK", {"status": "ok", "models": list(self.batchers)}
+        if method == "GET" and path == "/metrics":
+            return "200 OK", {key: batcher.metrics.snapshot() for key, batcher in self.batchers.items()}
+        if method == "POST" and path.startswith("/score/"):
+            key = path[len("/score/"):]
+            if key not in self.batchers:
+                return "404 Not Found", {"error": f"unknown model {key!r}", "models": list(self.batchers)}
+            try:
+                request = json.loads(body or b"{}")
+                texts = request["texts"] if "texts" in request else [request["text"]]
+                if not texts or not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError):
+                return "400 Bad Request", {"error": 'expected {"texts": [str, ...]} (non-empty) or {"text": str}'}
+            deadline_ms = request.get("deadline_ms")
+            if deadline_ms is not None and (
+                isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or not deadline_ms > 0
+            ):
+                return "400 Bad Request", {"error": "deadline_ms must be a positive number"}
+            try:
+                results = await self.batchers[key].submit(texts, deadline_ms)
+            except TooLarge as exc:
+                return "413 Payload Too Large", {"error": str(exc), "max_texts": self.batchers[key].max_pending}
+            except Overloaded:
+                return "503 Service Unavailable", {"error": "queue full, retry later"}
+            except DeadlineExceeded:
+                return "504 Gateway Timeout", {"error": "deadline exceeded"}
+            except Exception as exc:
+                return "500 Internal Server Error", {"error": f"{type(exc).__name__}: {exc}"}
+            return "200 OK", {"model": key, "results": results}
+        return "404 Not Found", {"error": f"no route for {method} {path}"}
+
+
+async def serve(
+    models,
+    host="127.0.0.1",
+    port=8000,
+    max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+    max_wait_ms=DEFAULT_MAX_WAIT_MS,
+    max_pending=DEFAULT_MAX_PENDING,
+    **options,
+):
+    """Load the models, then serve until cancelled."""
+    # One inference thread shared by all models: torch already uses every core per batch
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    batchers = {}
+    for key in models:
+        score_fn = await loop.run_in_executor(executor, lambda key=key: model_score_fn(key, **options))
+        batchers[key] = MicroBatcher(score_fn, max_batch_size, max_wait_ms, max_pending, executor)
+        batchers[key].start()
+    server = await asyncio.start_server(EmotionService(batchers).handle, host, port)
+    print(f"Serving {', '.join(models)} on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for batcher in batchers.values():
+            await batcher.stop()
+        executor.shutdown()
+
+
+def main(argv=None):
+    from inference import MODEL_SPECS
+
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP service for the emotion classifiers.")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_SPECS), choices=list(MODEL_SPECS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument("--backend", default="eager")
+    parser.add_argument("--dedup", choices=("exact", "near"), default=None, help="score repeated texts in a batch once")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    try:
+        asyncio.run(serve(
+            args.models,
+            args.host,
+            args.port,
+            args.max_batch_size,
+            args.max_wait_ms,
+            args.max_pending,
+            backend=args.backend,
+            dedup=args.dedup,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""One tokenization pass for every model that shares a tokenizer.
+
+The three classifiers are RoBERTa models. When their tokenizers are the
+same, each segment gets the same input IDs from all of them, so tokenizing
+a batch separately for each model repeats identical work. tokenizer_groups
+compares fast tokenizers by a digest of their serialized pipeline:
+vocabulary, merges, normalizer, pre-tokenizer and post-processor. Their
+truncation length, pad token and padding side are part of the digest too.
+A slow tokenizer is never assumed to match another.
+
+A SharedEncoder tokenizes and pads for every model of one group. It keeps
+the token IDs of recently seen texts, so a text is tokenized once however
+many models ask for it. It also keeps the padded batches of the last
+request, which the next model reuses when it asks for the same texts, so
+those models read the same input-ID and attention-mask tensors. Only
+tokenization and padding are shared: each model still runs its own forward
+passes, on the texts it asked for and when it asks for them.
+
+SharedInference gives the per-model predict functions the streaming
+scorers, incremental.score_functions and the notebook's helpers use, with
+the outputs of predict_probs. tokenization_stats counts texts tokenized, their tokens and
+seconds, and the per-model tokenizations avoided.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+
+from inference import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_WINDOW_STRIDE,
+    LONG_SEGMENT_MODES,
+    MODEL_SPECS,
+    context_length,
+    pad_rows,
+    predict_probs,
+    reduce_windows,
+    run_model,
+    tokenize_units,
+)
+from profiling import stage
+from scheduler import DEFAULT_TOKEN_BUDGET, plan_batches
+
+# Texts whose token IDs a SharedEncoder keeps for the group's other models
+TOKEN_CACHE_TEXTS = 4096
+
+
+def tokenizer_fingerprint(tokenizer):
+    """Digest of everything that decides a fast tokenizer's model inputs, or None if it is slow."""
+    if not getattr(tokenizer, "is_fast", False):
+        return None
+    config = json.loads(tokenizer.backend_tokenizer.to_str())
+    # Set per call by transformers, not part of the tokenizer itself
+    config.pop("truncation", None)
+    config.pop("padding", None)
+    config["context_length"] = context_length(tokenizer)
+    config["pad_token_id"] = tokenizer.pad_token_id
+    config["padding_side"] = tokenizer.padding_side
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def tokenizer_groups(tokenizers):
+    """Lists of keys of {key: tokenizer} whose tokenizers give identical inputs."""
+    groups = {}
+    for key, tokenizer in tokenizers.items():
+        fingerprint = tokenizer_fingerprint(tokenizer)
+        groups.setdefault(fingerprint or ("slow", key), []).append(key)
+    return list(groups.values())
+
+
+class TokenizationStats:
+    """Running totals for the shared encoders."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.passes = 0
+        self.texts = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self.saved = 0
+
+    def add(self, texts=0, tokens=0, seconds=0.0, reused=0):
+        with self._lock:
+            self.passes += bool(texts)
+            self.texts += texts
+            self.tokens += tokens
+            self.seconds += seconds
+            self.saved += reused
+
+    def report(self):
+        return {
+            "passes": self.passes,
+            "texts": self.texts,
+            "tokens": self.tokens,
+            "tokenize_seconds": round(self.seconds, 3),
+            "tokenizations_saved": self.saved,
+        }
+
+
+# Updated by every SharedEncoder in this process
+tokenization_stats = TokenizationStats()
+
+
+@dataclass
+class Encoded:
+    """Padded model inputs for a list of texts."""
+
+    texts: tuple
+    # (unit rows, padded tensors) of every forward pass
+    batches: list
+    owner: np.ndarray
+    lengths: list
+
+
+class SharedEncoder:
+    """Tokenizes and pads texts once for all the models of a tokenizer group.
+
+    Options are those of predict_probs. Batches are token_budget buckets of
+    at most batch_size inputs, or with token_budget=None batch_size consecutive
+    inputs.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        batch_size=DEFAULT_BATCH_SIZE,
+        long_segments="truncate",
+        window_stride=DEFAULT_WINDOW_STRIDE,
+        window_reduction="mean",
+        token_budget=DEFAULT_TOKEN_BUDGET,
+        max_texts=TOKEN_CACHE_TEXTS,
+    ):
+        if long_segments not in LONG_SEGMENT_MODES:
+            raise ValueError(f"Unknown long_segments mode: {long_segments!r}")
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.long_segments = long_segments
+        self.window_stride = window_stride
+        self.window_reduction = window_reduction
+        self.token_budget = token_budget
+        self.max_texts = max_texts
+        # text -> (input IDs, attention masks) of its units, least recently used first
+        self._units = OrderedDict()
+        self._last = None
+
+    def encode(self, texts):
+        """Encoded inputs for texts, tokenizing only texts not seen recently."""
+        texts = tuple(texts)
+        if self._last is not None and self._last.texts == texts:
+            tokenization_stats.add(reused=len(texts))
+            return self._last
+        units = self._units
+        new = [text for text in dict.fromkeys(texts) if text not in units]
+        if new:
+            start = time.perf_counter()
+            input_ids, attention_mask, owner = tokenize_units(self.tokenizer, new, self.long_segments, self.window_stride)
+            for text in new:
+                units[text] = ([], [])
+            for ids, mask, i in zip(input_ids, attention_mask, owner):
+                units[new[i]][0].append(ids)
+                units[new[i]][1].append(mask)
+            tokenization_stats.add(len(new), sum(len(ids) for ids in input_ids), time.perf_counter() - start)
+        tokenization_stats.add(reused=len(texts) - len(new))
+
+        input_ids, attention_mask, owner = [], [], []
+        for i, text in enumerate(texts):
+            unit_ids, unit_mask = units[text]
+            units.move_to_end(text)
+            input_ids += unit_ids
+            attention_mask += unit_mask
+            owner += [i] * len(unit_ids)
+        while len(units) > self.max_texts:
+            units.popitem(last=False)
+
+        lengths = [len(ids) for ids in input_ids]
+        owner = np.asarray(owner, dtype=np.int64)
+        if self.token_budget is not None:
+            plan = plan_batches(lengths, self.token_budget, self.batch_size)
+        else:
+            # As predict_probs: batch_size texts at a time, their units batch_size at a time
+            plan = []
+            bounds = np.searchsorted(owner, np.arange(0, len(texts) + self.batch_size, self.batch_size))
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                plan += [np.arange(i, min(i + self.batch_size, stop)) for i in range(start, stop, self.batch_size)]
+        # Padded once; every model asking for these texts reads the same tensors
+        batches = [(rows, pad_rows(self.tokenizer, input_ids, attention_mask, rows)) for rows in plan]
+        self._last = Encoded(texts, batches, owner, lengths)
+        return self._last
+
+    def predict(self, model, activation, texts):
+        """(len(texts), num_labels) probabilities of one model of the group."""
+        if not len(texts):
+            return np.empty((0, model.config.num_labels), dtype=np.float32)
+        encoded = self.encode(texts)
+        unit_probs = np.empty((len(encoded.lengths), model.config.num_labels), dtype=np.float32)
+        for rows, inputs in encoded.batches:
+            unit_probs[rows] = run_model(model, inputs, activation)
+        if self.long_segments == "window":
+            return reduce_windows(unit_probs, encoded.owner, len(texts), encoded.lengths, self.window_reduction)
+        return unit_probs
+
+
+def _deduplicated(predict, texts, dedup, near_threshold):
+    """predict(texts) with each distinct text scored once, as predict_probs does."""
+    from dedup import DEFAULT_NEAR_THRESHOLD, find_duplicates
+
+    duplicates = find_duplicates(texts, dedup, near_threshold or DEFAULT_NEAR_THRESHOLD)
+    if duplicates.unique == len(texts):
+        return predict(texts)
+    return duplicates.expand(predict([texts[i] for i in duplicates.representatives]))
+
+
+class SharedInference:
+    """Per-model predict functions whose models share encoders by tokenizer group."""
+
+    def __init__(self, keys, batch_size=DEFAULT_BATCH_SIZE, backend="eager", **options):
+        from model_registry import load_model
+
+        self.batch_size = batch_size
+        self.options = options
+        self.models = {}
+        for key in keys:
+            spec = MODEL_SPECS[key]
+            tokenizer, model = load_model(spec["model_name"], backend=backend)
+            self.models[key] = (model, tokenizer, spec["activation"])
+        self.groups = tokenizer_groups({key: entry[1] for key, entry in self.models.items()})
+        encoder_options = {name: value for name, value in options.items() if name not in ("dedup", "near_threshold")}
+        # Models alone in their group keep plain predict_probs
+        self._encoders = {}
+        for group in self.groups:
+            if len(group) > 1:
+                encoder = SharedEncoder(self.models[group[0]][1], batch_size, **encoder_options)
+                self._encoders.update(dict.fromkeys(group, encoder))
+
+    def predict(self, key, texts):
+        """(len(texts), num_labels) probabilities of model key, as predict_probs returns them.
+
+        Only model key runs; its forward passes are recorded under the caller's stage.
+        """
+        texts = list(texts)
+        model, tokenizer, activation = self.models[key]
+        encoder = self._encoders.get(key)
+        if encoder is None:
+            return predict_probs(model, tokenizer, texts, activation, self.batch_size, **self.options)
+        predict = partial(encoder.predict, model, activation)
+        dedup = self.options.get("dedup")
+        if dedup is not None and texts:
+            return _deduplicated(predict, texts, dedup, self.options.get("near_threshold"))
+        return predict(texts)
+
+    def predictor(self, key):
+        """predict for model key, timed under stage(key)."""
+
+        def predict(texts):
+            with stage(key):
+                return self.predict(key, texts)
+
+        return predict
@@ -0,0 +1,301 @@
+"""Streaming transcript ingestion with incremental result output.
+
+For transcripts too large to read into memory. Segments are produced by a
+generator that follows the notebook's splitting rules, flow through the
+classifiers in bounded chunks, and each chunk's rows are appended to a JSONL
+or Parquet file before the next chunk is read, so peak memory depends on the
+chunk size rather than the transcript size.
+
+    from streaming import run_streaming
+    run_streaming("milei_speech.txt", "milei_scores.jsonl", mode="paragraph")
+"""
+
+import json
+import os
+from itertools import islice
+
+from inference import DEFAULT_BATCH_SIZE, MODEL_SPECS, predict_probs
+from model_registry import load_model
+from profiling import stage
+from scheduler import DEFAULT_TOKEN_BUDGET
+
+# Segments held in memory at once
+DEFAULT_CHUNK_SIZE = 1024
+
+# Line mode keeps segments longer than this, as in the notebook
+MIN_LINE_CHARS = 30
+
+# Paragraphs longer than this are segmented line by line instead, so a file
+# with no blank lines is never held in memory whole
+MAX_PARAGRAPH_CHARS = 1 << 16
+
+
+def _paragraph_lines(text):
+    return [line for line in text.split("\n") if line.strip()]
+
+
+def _paragraph_segments(piece):
+    """Segments of one piece of text.split('\\n\\n')."""
+    if len(piece) > MAX_PARAGRAPH_CHARS:
+        return _paragraph_lines(piece)
+    return [piece] if piece.strip() else []
+
+
+def iter_paragraphs(path, encoding="utf-8"):
+    """Yield the paragraph segments of split_segments without reading the whole file.
+
+    The file is read line by line. A line that is just "\\n" closes a
+    "\\n\\n" with the previous line's newline, unless that newline already
+    closed one. A paragraph is yielded line by line as soon as it passes
+    MAX_PARAGRAPH_CHARS, so memory is bounded by the longest line.
+    """
+    with open(path, "r", encoding=encoding) as file:
+        lines, size = [], 0
+        long_paragraph = False
+        # No newline before the first line to pair with
+        after_separator = True
+        for line in file:
+            if line == "\n" and not after_separator:
+                if not long_paragraph:
+                    # The previous line's newline belongs to the separator
+                    yield from _paragraph_segments("".join(lines)[:-1])
+                lines, size, long_paragraph = [], 0, False
+                after_separator = True
+                continue
+            after_separator = False
+            if long_paragraph:
+                yield from _paragraph_lines(line)
+                continue
+            lines.append(line)
+            size += len(line)
+            # Over the limit even if the paragraph ended here, without its last newline
+            if size - 1 > MAX_PARAGRAPH_CHARS:
+                yield from _paragraph_lines("".join(lines))
+                lines, size, long_paragraph = [], 0, True
+        if not long_paragraph:
+            yield from _paragraph_segments("".join(lines))
+
+
+def iter_lines(path, min_chars=MIN_LINE_CHARS, encoding="utf-8"):
+    """Yield stripped lines longer than min_chars, one line in memory at a time."""
+    with open(path, "r", encoding=encoding) as file:
+        for line in file:
+            segment = line.strip()
+            if len(segment) > min_chars:
+                yield segment
+
+
+def iter_segments(path, mode="line", **kwargs):
+    """Segment a transcript lazily: "paragraph" (blank-line split) or "line"."""
+    if mode == "paragraph":
+        return iter_paragraphs(path, **kwargs)
+    if mode == "line":
+        return iter_lines(path, **kwargs)
+    raise ValueError(f"Unknown segmentation mode: {mode!r}")
+
+
+def split_segments(text, mode="line", min_chars=MIN_LINE_CHARS):
+    """Segment an in-memory transcript by the same rules as iter_segments.
+
+    A segment's ID is its position in the returned list. Every model output
+    for the transcript is stored in that order, so outputs line up by ID.
+    """
+    if mode == "paragraph":
+        return [segment for piece in text.split("\n\n") for segment in _paragraph_segments(piece)]
+    if mode == "line":
+        return [line.strip() for line in text.split("\n") if len(line.strip()) > min_chars]
+    raise ValueError(f"Unknown segmentation mode: {mode!r}")
+
+
+def iter_chunks(iterable, size):
+    """Yield lists of at most size consecutive items."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def model_labels(model, spec):
+    return spec.get("labels") or [model.config.id2label[i] for i in range(model.config.num_labels)]
+
+
+def transformer_scorer(
+    key, batch_size=DEFAULT_BATCH_SIZE, cache=None, threshold=0.5, backend="eager", token_budget=DEFAULT_TOKEN_BUDGET, shared=None, **options
+):
+    """Scorer for one of MODEL_SPECS: texts -> list of flat column dicts.
+
+    With shared (a SharedInference holding key), texts are tokenized once for
+    all of its models with the same tokenizer.
+    """
+    spec = MODEL_SPECS[key]
+    tokenizer, model = load_model(spec["model_name"], backend=backend)
+    labels = model_labels(model, spec)
+    multi_label = spec["activation"] == "sigmoid"
+
+    def predict(texts):
+        if shared is not None:
+            return shared.predict(key, texts)
+        return predict_probs(
+            model, tokenizer, texts, activation=spec["activation"], batch_size=batch_size, token_budget=token_budget, **options
+        )
+
+    def score(texts):
+        with stage(key):
+            if cache is not None:
+                params = dict(options, backend=backend)
+                # Exact dedup merges byte-identical texts only, so it gives the
+                # same rows as none; near dedup copies rows between texts
+                if params.get("dedup") != "near":
+                    params.pop("dedup", None)
+                    params.pop("near_threshold", None)
+                if multi_label:
+                    params["threshold"] = threshold
+                probs = cache.probs(texts, spec["model_name"], predict, **params)
+            else:
+                probs = predict(texts)
+            rows = []
+            for row_probs in probs:
+                row = {f"{key}_{label}": round(float(prob), 4) for label, prob in zip(labels, row_probs)}
+                row[f"{key}_top"] = labels[int(row_probs.argmax())]
+                if multi_label:
+                    row[f"{key}_predicted"] = [label for label, prob in zip(labels, row_probs) if prob > threshold]
+                rows.append(row)
+            return rows
+
+    return score
+
+
+def nrc_scorer(cache=None):
+    """Scorer for the NRC lexicon: texts -> list of flat column dicts."""
+    from nrc_lexicon import EMOTIONS, get_lexicon
+
+    lexicon = get_lexicon()
+
+    def score(texts):
+        with stage("nrc"):
+            scored = cache.records(texts, "nrc_lexicon", lexicon.score, **lexicon.cache_params) if cache is not None else lexicon.score(texts)
+            rows = []
+            for result in scored:
+                raw_scores = result["raw_scores"]
+                row = {f"nrc_{emotion}": raw_scores.get(emotion, 0) for emotion in EMOTIONS}
+                row["nrc_top"] = max(raw_scores, key=raw_scores.get) if raw_scores else None
+                rows.append(row)
+            return rows
+
+    return score
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, rows):
+        self._file.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """One row group per chunk; the schema is fixed by the first chunk."""
+
+    def __init__(self, path):
+        import pyarrow.parquet as pq
+
+        self._pq = pq
+        self._path = path
+        self._writer = None
+
+    def write(self, rows):
+        import pyarrow as pa
+
+        if self._writer is None:
+            table = pa.Table.from_pylist(rows)
+            # Columns that were empty in the first chunk default to strings
+            schema = pa.schema([
+                field.with_type(pa.list_(pa.string()) if pa.types.is_list(field.type) else pa.string())
+                if field.type == pa.null() or field.type == pa.list_(pa.null()) else field
+                for field in table.schema
+            ])
+            table = table.cast(schema)
+            self._writer = self._pq.ParquetWriter(self._path, schema)
+        else:
+            table = pa.Table.from_pylist(rows, schema=self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path):
+    if os.path.splitext(path)[1] == ".parquet":
+        return ParquetWriter(path)
+    return JsonlWriter(path)
+
+
+def make_scorers(models, batch_size=DEFAULT_BATCH_SIZE, cache=None, shared_tokenization=True, **options):
+    """Scorers for the given model keys ("nrc" or a key of MODEL_SPECS).
+
+    Transformer models whose tokenizers match share tokenization and padding
+    unless shared_tokenization is False.
+    """
+    keys = [key for key in models if key != "nrc"]
+    shared = None
+    if shared_tokenization and len(keys) > 1:
+        from shared_inference import SharedInference
+
+        shared_options = {name: value for name, value in options.items() if name != "threshold"}
+        shared_options.setdefault("token_budget", DEFAULT_TOKEN_BUDGET)
+        shared = SharedInference(keys, batch_size, **shared_options)
+    return [
+        nrc_scorer(cache) if key == "nrc" else transformer_scorer(key, batch_size, cache, shared=shared, **options)
+        for key in models
+    ]
+
+
+def score_chunk(chunk, scorers, start_index=0):
+    """Output rows for one chunk of segments, numbered from start_index."""
+    rows = [{"segment": start_index + i, "text": text} for i, text in enumerate(chunk)]
+    for scorer in scorers:
+        for row, columns in zip(rows, scorer(chunk)):
+            row.update(columns)
+    return rows
+
+
+def stream_scores(segments, scorers, writer, chunk_size=DEFAULT_CHUNK_SIZE, start_index=0):
+    """Score an iterable of segments chunk by chunk and write each chunk's rows.
+
+    Returns the number of segments written.
+    """
+    count = 0
+    chunks = iter_chunks(segments, chunk_size)
+    while True:
+        # Reading and segmenting happen lazily, as the next chunk is drawn
+        with stage("read_segments"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return count
+        rows = score_chunk(chunk, scorers, start_index + count)
+        with stage("write"):
+            writer.write(rows)
+        count += len(chunk)
+
+
+def run_streaming(
+    transcript_path,
+    output_path,
+    mode="line",
+    models=("go_emotions", "distilroberta", "sentiment", "nrc"),
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    batch_size=DEFAULT_BATCH_SIZE,
+    cache=None,
+    **options,
+):
+    """Stream one transcript through the selected models into output_path."""
+    scorers = make_scorers(models, batch_size, cache, **options)
+    writer = open_writer(output_path)
+    try:
+        return stream_scores(iter_segments(transcript_path, mode), scorers, writer, chunk_size)
+    finally:
+        writer.close()
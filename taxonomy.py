@@ -0,0 +1,102 @@
+"""Mapping the models' label sets onto shared taxonomies.
+
+go_emotions has 28 labels, the j-hartmann model has Ekman's six plus
+neutral, the cardiffnlp model has three sentiment classes and the NRC
+lexicon has eight emotions plus two sentiment polarities. To compare them,
+each label set is projected onto a taxonomy by a (labels x categories) 0/1
+matrix.
+
+EKMAN    go_emotions is grouped by the Ekman mapping published with the
+         GoEmotions dataset. NRC's anticipation, trust, positive and
+         negative have no Ekman counterpart and map to nothing; of the
+         sentiment classes only neutral maps.
+POLARITY Ekman groups map to negative, positive or neutral, which
+         reproduces GoEmotions' own sentiment mapping; surprise
+         ("ambiguous" there) maps to nothing. A label set with its own
+         positive/negative labels (sentiment, NRC) is mapped by its
+         polarity labels alone, so NRC's emotion counts are not counted
+         a second time.
+"""
+
+import numpy as np
+
+EKMAN = ("anger", "disgust", "fear", "joy", "sadness", "surprise", "neutral")
+POLARITY = ("negative", "neutral", "positive")
+TAXONOMIES = {"ekman": EKMAN, "polarity": POLARITY}
+
+# From the GoEmotions repository (data/ekman_mapping.json)
+GO_EMOTIONS_TO_EKMAN = {
+    "anger": ("anger", "annoyance", "disapproval"),
+    "disgust": ("disgust",),
+    "fear": ("fear", "nervousness"),
+    "joy": (
+        "joy", "amusement", "approval", "excitement", "gratitude", "love",
+        "optimism", "relief", "pride", "admiration", "desire", "caring",
+    ),
+    "sadness": ("sadness", "disappointment", "embarrassment", "grief", "remorse"),
+    "surprise": ("surprise", "realization", "confusion", "curiosity"),
+    "neutral": ("neutral",),
+}
+
+# From the GoEmotions repository (data/sentiment_mapping.json), by Ekman group
+EKMAN_TO_POLARITY = {
+    "anger": "negative",
+    "disgust": "negative",
+    "fear": "negative",
+    "sadness": "negative",
+    "joy": "positive",
+    "neutral": "neutral",
+}
+
+
+def ekman_group(label):
+    """The Ekman category of a label from any of the models, or None."""
+    if label in EKMAN:
+        return label
+    for group, members in GO_EMOTIONS_TO_EKMAN.items():
+        if label in members:
+            return group
+    return None
+
+
+def polarity_group(label):
+    """negative/neutral/positive for a label from any of the models, or None."""
+    if label in POLARITY:
+        return label
+    return EKMAN_TO_POLARITY.get(ekman_group(label))
+
+
+def mapping_matrix(labels, target=EKMAN):
+    """(labels x target) float32 matrix with a 1 where a label falls in a target category."""
+    if target == POLARITY and {"negative", "positive"} & set(labels):
+        group = {label: label for label in POLARITY}.get
+    else:
+        group = polarity_group if target == POLARITY else ekman_group
+    matrix = np.zeros((len(labels), len(target)), dtype=np.float32)
+    index = {name: j for j, name in enumerate(target)}
+    for i, label in enumerate(labels):
+        category = group(label)
+        if category in index:
+            matrix[i, index[category]] = 1.0
+    return matrix
+
+
+def project(scores, labels, reduction="sum", target=EKMAN):
+    """(segments x labels) scores -> (segments x target).
+
+    "sum" adds up the scores in each group (counts, softmax probabilities);
+    "max" takes the group's highest score (independent sigmoid outputs).
+    """
+    mapping = mapping_matrix(labels, target)
+    scores = np.asarray(scores, dtype=np.float32)
+    if reduction == "sum":
+        return scores @ mapping
+    if reduction == "max":
+        # One column slice per category; unmapped labels and empty groups give 0
+        projected = np.zeros((len(scores), len(target)), dtype=np.float32)
+        for j in range(len(target)):
+            members = np.flatnonzero(mapping[:, j])
+            if len(members):
+                projected[:, j] = scores[:, members].max(axis=1).clip(min=0.0)
+        return projected
+    raise ValueError(f"Unknown reduction: {reduction!r}")
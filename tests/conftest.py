@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def tiny_model_paths(tmp_path_factory):
+    """{key: checkpoint directory} of the benchmark's tiny random classifiers."""
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from benchmark import build_random_models
+
+    return build_random_models("tiny", str(tmp_path_factory.mktemp("models")))
+
+
+@pytest.fixture
+def tiny_models(tiny_model_paths, monkeypatch):
+    """MODEL_SPECS pointed at the tiny random classifiers, for this test only."""
+    from inference import MODEL_SPECS
+
+    for key, path in tiny_model_paths.items():
+        monkeypatch.setitem(MODEL_SPECS[key], "model_name", path)
+    return tiny_model_paths
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from agreement import AgreementAnalysis
+from nrc_lexicon import EMOTIONS
+
+LABELS = {
+    "distilroberta": ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"],
+    "sentiment": ["negative", "neutral", "positive"],
+    "nrc": list(EMOTIONS),
+}
+
+
+def speech_scores(rng, segments):
+    scores = {key: rng.random((segments, len(labels))) for key, labels in LABELS.items() if key != "nrc"}
+    # Integer word counts, with some segments that match no NRC word at all
+    nrc = rng.integers(0, 3, size=(segments, len(EMOTIONS)))
+    nrc[rng.random(segments) < 0.2] = 0
+    scores["nrc"] = nrc
+    return scores
+
+
+def report(speeches, taxonomy, chunk_size):
+    analysis = AgreementAnalysis(LABELS, taxonomy, window=5)
+    for speech, scores in speeches.items():
+        segments = len(next(iter(scores.values())))
+        for start in range(0, segments, chunk_size):
+            analysis.update({key: values[start:start + chunk_size] for key, values in scores.items()}, speech)
+    return analysis.report()
+
+
+@pytest.mark.parametrize("taxonomy", ["ekman", "polarity"])
+def test_chunked_updates_give_the_one_shot_report(taxonomy):
+    rng = np.random.default_rng(0)
+    speeches = {"first": speech_scores(rng, 60), "second": speech_scores(rng, 23)}
+    one_shot = report(speeches, taxonomy, 60)
+    for chunk_size in (1, 7):
+        assert report(speeches, taxonomy, chunk_size) == one_shot
@@ -0,0 +1,24 @@
+import os
+
+import numpy as np
+import pytest
+
+
+def test_onnx_export_is_renamed_into_place(tiny_models, tmp_path):
+    pytest.importorskip("onnxruntime")
+    from backends import prepare
+    from inference import MODEL_SPECS, predict_probs
+    from model_registry import load_model
+
+    spec = MODEL_SPECS["distilroberta"]
+    tokenizer, model = load_model(spec["model_name"])
+    onnx_dir = str(tmp_path / "onnx")
+    classifier = prepare(model, tokenizer, spec["model_name"], backend="onnx", onnx_dir=onnx_dir)
+    # Only the finished graph is left; the per-process temporary file is gone
+    assert os.listdir(onnx_dir) == [os.path.basename(classifier.path)]
+    texts = ["We will win.", "Thank you all, and God bless the people of this country."]
+    np.testing.assert_allclose(
+        predict_probs(classifier, tokenizer, texts, spec["activation"]),
+        predict_probs(model, tokenizer, texts, spec["activation"]),
+        atol=1e-5,
+    )
@@ -0,0 +1,29 @@
+import numpy as np
+
+from dedup import find_duplicates
+
+VARIANTS = ["Thank you…", "Thank you...", "We  will win.", "We will win.", "\nWe will win.", "We will win."]
+
+
+def test_exact_groups_only_byte_identical_texts():
+    duplicates = find_duplicates(VARIANTS, "exact")
+    assert duplicates.unique == 5
+    np.testing.assert_array_equal(duplicates.representatives[duplicates.inverse], [0, 1, 2, 3, 4, 3])
+
+
+def test_near_merges_normalised_variants():
+    duplicates = find_duplicates(VARIANTS, "near")
+    assert duplicates.inverse[2] == duplicates.inverse[3] == duplicates.inverse[4]
+
+
+def test_exact_dedup_scores_equal_no_dedup(tiny_models):
+    from inference import MODEL_SPECS, predict_probs
+    from model_registry import load_model
+
+    spec = MODEL_SPECS["distilroberta"]
+    tokenizer, model = load_model(spec["model_name"])
+    texts = VARIANTS * 3 + ["A longer segment about the future of every family in the country."]
+    for token_budget in (None, 256):
+        plain = predict_probs(model, tokenizer, texts, spec["activation"], 4, token_budget=token_budget)
+        deduplicated = predict_probs(model, tokenizer, texts, spec["activation"], 4, token_budget=token_budget, dedup="exact")
+        np.testing.assert_allclose(deduplicated, plain, atol=1e-6)
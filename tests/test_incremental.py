@@ -0,0 +1,54 @@
+import numpy as np
+
+import nrc_lexicon
+from incremental import _config, reanalyze
+
+MODELS = ("distilroberta", "sentiment", "nrc")
+
+ORIGINAL = [f"Line {i}: we will protect the freedom and the future of every family here." for i in range(40)]
+
+
+def edited():
+    lines = list(ORIGINAL)
+    lines[3] = "A changed line about fear, anger and the hope of a better tomorrow."
+    del lines[10:13]
+    lines[20:20] = ["An inserted line that celebrates joy and trust among the nations.", "Another inserted line."]
+    lines.append("A closing line that thanks everyone for listening so carefully.")
+    return lines
+
+
+def write(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_reanalyze_after_edit_equals_full_rerun(tmp_path, tiny_models):
+    transcript = tmp_path / "speech.txt"
+    reanalyze("speech", write(transcript, ORIGINAL), state_dir=str(tmp_path / "state"), models=MODELS)
+    incremental, report = reanalyze("speech", write(transcript, edited()), state_dir=str(tmp_path / "state"), models=MODELS)
+    full, full_report = reanalyze("speech", str(transcript), state_dir=str(tmp_path / "fresh"), models=MODELS)
+
+    assert not report["full_run"] and full_report["full_run"]
+    assert report["rescored"] < len(incremental)
+    np.testing.assert_array_equal(incremental.hashes, full.hashes)
+    for key in MODELS:
+        assert incremental.labels[key] == full.labels[key]
+        np.testing.assert_allclose(incremental.scores[key], full.scores[key], atol=1e-6)
+        np.testing.assert_array_equal(incremental.flow[key], full.flow[key])
+        np.testing.assert_array_equal(incremental.counts[key], full.counts[key])
+
+
+def test_lexicon_change_triggers_a_full_run(tmp_path, monkeypatch):
+    transcript = write(tmp_path / "speech.txt", ORIGINAL)
+    state_dir = str(tmp_path / "state")
+    monkeypatch.setattr(nrc_lexicon, "get_lexicon", lambda: nrc_lexicon.NRCLexicon(lemmatize=None))
+    config = _config(("nrc",), {})
+    assert nrc_lexicon.get_lexicon().version in config
+    reanalyze("speech", transcript, state_dir=state_dir, models=("nrc",))
+    _, report = reanalyze("speech", transcript, state_dir=state_dir, models=("nrc",))
+    assert not report["full_run"]
+
+    monkeypatch.setattr(nrc_lexicon, "get_lexicon", lambda: nrc_lexicon.NRCLexicon(lemmatize=str.lower))
+    assert _config(("nrc",), {}) != config
+    _, report = reanalyze("speech", transcript, state_dir=state_dir, models=("nrc",))
+    assert report["full_run"]
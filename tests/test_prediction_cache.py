@@ -0,0 +1,55 @@
+import numpy as np
+
+from prediction_cache import PredictionCache, cache_key
+from results import ProbabilityMatrix
+
+LABELS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+
+
+def score(texts):
+    return np.full((len(texts), len(LABELS)), 1 / len(LABELS), dtype=np.float32)
+
+
+def test_probs_of_no_texts_keep_the_label_columns(tmp_path):
+    cache = PredictionCache(str(tmp_path / "cache.sqlite"))
+    probs = cache.probs([], "model", score)
+    assert probs.shape == (0, len(LABELS))
+    assert probs.dtype == np.float32
+    frame = ProbabilityMatrix(probs, LABELS).to_frame(decimals=4)
+    assert frame.empty
+    assert list(frame.columns) == LABELS
+    cache.close()
+
+
+def test_probs_round_trip_through_the_cache(tmp_path):
+    cache = PredictionCache(str(tmp_path / "cache.sqlite"))
+    first = cache.probs(["a", "b", "a"], "model", score)
+    second = cache.probs(["b", "a"], "model", lambda texts: 1 / 0)
+    assert first.shape == (3, len(LABELS))
+    np.testing.assert_array_equal(second, first[[1, 0]])
+    assert cache.stats()["hits"] == 2
+    cache.close()
+
+
+def test_nrc_cache_params_change_the_key():
+    from nrc_lexicon import NRCLexicon
+
+    plain = NRCLexicon(lemmatize=None)
+    lemmatised = NRCLexicon(lemmatize=str.lower)
+    assert plain.cache_params != lemmatised.cache_params
+    assert cache_key("text", "nrc_lexicon", **plain.cache_params) != cache_key("text", "nrc_lexicon", **lemmatised.cache_params)
+
+
+def test_exact_dedup_leaves_the_cache_key_unchanged(tmp_path, tiny_models):
+    from streaming import transformer_scorer
+
+    cache = PredictionCache(str(tmp_path / "cache.sqlite"))
+    texts = ["We will win.", "We will win.", "We  will win.", "Thank you all."]
+    deduplicated = transformer_scorer("distilroberta", cache=cache, dedup="exact")(texts)
+    misses = cache.misses
+    assert transformer_scorer("distilroberta", cache=cache)(texts) == deduplicated
+    assert cache.misses == misses
+    # Near dedup copies rows between texts, so it is cached separately
+    transformer_scorer("distilroberta", cache=cache, dedup="near")(texts)
+    assert cache.misses == misses + len(texts)
+    cache.close()
@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+from service import EmotionService, MicroBatcher
+
+
+def score(texts):
+    return [{"length": len(text)} for text in texts]
+
+
+def route(batcher, texts):
+    async def run():
+        batcher.start()
+        try:
+            return await EmotionService({"m": batcher}).route("POST", "/score/m", json.dumps({"texts": texts}).encode())
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(run())
+
+
+def test_request_within_max_pending_is_scored():
+    status, payload = route(MicroBatcher(score, max_wait_ms=1, max_pending=3), ["a", "bb", "ccc"])
+    assert status == "200 OK"
+    assert payload["results"] == [{"length": 1}, {"length": 2}, {"length": 3}]
+
+
+def test_request_over_max_pending_is_refused_with_the_limit():
+    batcher = MicroBatcher(score, max_wait_ms=1, max_pending=3)
+    status, payload = route(batcher, ["a", "b", "c", "d"])
+    assert status == "413 Payload Too Large"
+    assert payload["max_texts"] == 3
+    assert batcher.metrics.rejected == 1
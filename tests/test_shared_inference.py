@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from benchmark import synthetic_corpus
+
+KEYS = ["go_emotions", "distilroberta", "sentiment"]
+
+OPTIONS = [
+    {},
+    {"token_budget": None},
+    {"token_budget": 256},
+    {"long_segments": "window"},
+    {"long_segments": "window", "token_budget": None},
+    {"long_segments": "window", "token_budget": 512, "window_reduction": "length"},
+    {"dedup": "exact"},
+    {"dedup": "near", "token_budget": 256},
+]
+
+
+@pytest.fixture
+def texts():
+    texts = synthetic_corpus(20, 12, seed=1) + synthetic_corpus(3, 700, seed=2)
+    # Repeats for dedup, and an empty-ish and a near-duplicate variant
+    return texts + texts[:5] + [texts[0] + "!", "Yes."]
+
+
+@pytest.mark.parametrize("options", OPTIONS, ids=lambda options: ",".join(f"{k}={v}" for k, v in options.items()) or "default")
+def test_shared_predictions_equal_predict_probs(tiny_models, texts, options):
+    from inference import MODEL_SPECS, predict_probs
+    from model_registry import load_model
+    from shared_inference import SharedInference
+
+    shared = SharedInference(KEYS, 4, **options)
+    assert shared.groups == [KEYS]
+    for key in KEYS:
+        tokenizer, model = load_model(MODEL_SPECS[key]["model_name"])
+        expected = predict_probs(model, tokenizer, texts, MODEL_SPECS[key]["activation"], 4, **options)
+        np.testing.assert_array_equal(shared.predict(key, texts), expected)
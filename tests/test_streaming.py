@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+import streaming
+from streaming import iter_lines, iter_segments, split_segments
+
+
+def stream(tmp_path, text, mode):
+    path = tmp_path / "speech.txt"
+    path.write_text(text, encoding="utf-8", newline="")
+    return list(iter_segments(str(path), mode))
+
+
+def random_text(rng, size):
+    pieces = ["a", "b", " ", "\n", "\n\n", "\n\n\n", "  \n", "word "]
+    return "".join(rng.choice(pieces) for _ in range(size))
+
+
+def test_streamed_paragraphs_match_split_segments(tmp_path, monkeypatch):
+    # A small limit puts the long-paragraph path in reach of short texts
+    monkeypatch.setattr(streaming, "MAX_PARAGRAPH_CHARS", 8)
+    rng = random.Random(0)
+    for _ in range(500):
+        text = random_text(rng, rng.randrange(40))
+        assert stream(tmp_path, text, "paragraph") == split_segments(text, "paragraph"), repr(text)
+
+
+def test_streamed_lines_match_split_segments(tmp_path):
+    rng = random.Random(1)
+    for _ in range(200):
+        text = random_text(rng, rng.randrange(40))
+        path = tmp_path / "speech.txt"
+        path.write_text(text, encoding="utf-8", newline="")
+        assert list(iter_lines(str(path), min_chars=2)) == split_segments(text, "line", min_chars=2), repr(text)
+
+
+def test_file_without_blank_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming, "MAX_PARAGRAPH_CHARS", 16)
+    text = "\n".join(f"line number {i}" for i in range(20))
+    assert stream(tmp_path, text, "paragraph") == split_segments(text, "paragraph")
+    assert stream(tmp_path, text, "paragraph") == [f"line number {i}" for i in range(20)]
+
+
+@pytest.mark.parametrize("extra", [-1, 0, 1, 2])
+def test_paragraph_at_the_length_limit(tmp_path, monkeypatch, extra):
+    limit = 20
+    monkeypatch.setattr(streaming, "MAX_PARAGRAPH_CHARS", limit)
+    paragraph = "x" * 9 + "\n" + "y" * (limit - 10 + extra)
+    text = f"intro\n\n{paragraph}\n\n{paragraph}"
+    # Up to the limit a paragraph is one segment; past it, one per line
+    expected = [paragraph] if len(paragraph) <= limit else paragraph.split("\n")
+    assert split_segments(text, "paragraph") == ["intro"] + expected + expected
+    assert stream(tmp_path, text, "paragraph") == split_segments(text, "paragraph")
+    assert stream(tmp_path, text + "\n", "paragraph") == split_segments(text + "\n", "paragraph")